@@ -0,0 +1,165 @@
+'''
+Headless benchmark of the simulation side of Bubbles and Chillout.
+
+Runs scripted scenarios against the bubble field, the pop hit-testing, the
+effect scheduler and the playlist without creating a window or any GL context,
+and prints one JSON object per scenario.
+
+	python benchmark.py                   # every scenario
+	python benchmark.py pops-20 storm     # selected scenarios
+	python benchmark.py storm --pops 100  # a scenario with some parameters changed
+	python benchmark.py --duration 60 --profile stress --bubbles 500
+	python benchmark.py --list
+
+Without a scenario name, the parameter options describe a 'custom' scenario
+that starts out as 'idle'.
+'''
+
+from argparse import ArgumentParser
+from random   import Random
+from time     import perf_counter
+from json     import dumps
+import tracemalloc
+
+import numpy as np
+
+from lib.bubblefield import BubbleField
+from lib.fixedstep   import FixedStep
+from lib.effects     import EffectScheduler
+from lib.playlist    import Playlist
+from lib.spawner     import Spawner, PROFILES
+
+
+SCREEN_WIDTH  = 1920
+SCREEN_HEIGHT = 1080
+BUBBLE_SIZE   = 300
+FPS           = 60
+
+# Simulated seconds, spawner profile, cap on live bubbles (None: the profile's own), pops per second, track changes per second
+SCENARIOS = {
+	'idle':        {'duration': 60, 'profile': 'default', 'bubbles': None, 'pops': 0,  'tracks': 0},
+	'calm':        {'duration': 60, 'profile': 'calm',    'bubbles': None, 'pops': 0,  'tracks': 0},
+	'500-bubbles': {'duration': 60, 'profile': 'stress',  'bubbles': 500,  'pops': 0,  'tracks': 0},
+	'pops-20':     {'duration': 60, 'profile': 'stress',  'bubbles': 500,  'pops': 20, 'tracks': 0},
+	'storm':       {'duration': 30, 'profile': 'stress',  'bubbles': 5000, 'pops': 50, 'tracks': 0},
+	'playlist':    {'duration': 60, 'profile': 'default', 'bubbles': None, 'pops': 0,  'tracks': 1}
+}
+
+
+def percentiles(samples: list[float]) -> dict:
+	if not samples:
+		return {}
+	p50, p95, p99 = np.percentile(samples, (50, 95, 99)).tolist()
+	return {'p50': p50, 'p95': p95, 'p99': p99, 'max': max(samples), 'mean': sum(samples) / len(samples)}
+
+
+def run_scenario(duration: float, profile: str, bubbles: int | None, pops: float, tracks: float, seed: int) -> dict:
+	'''
+	Simulates `duration` seconds at a fixed frame rate and times every frame.
+	'''
+	rng = np.random.default_rng(seed)
+	field = BubbleField(BUBBLE_SIZE)
+	spawn_profile = PROFILES[profile] if bubbles is None else PROFILES[profile] | {'max_bubbles': bubbles}
+	spawner = Spawner(spawn_profile, SCREEN_WIDTH, BUBBLE_SIZE, BUBBLE_SIZE // 2, seed)
+	effects = EffectScheduler(seed = seed)
+	playlist = Playlist([{'path': f'track{i}'} for i in range(20)], lambda track: track, lambda track: track, lambda: True, Random(seed))
+	sources = playlist.sources()
+
+	def simulation_step(dt: float) -> None:
+		field.step(dt)
+		field.cull(SCREEN_HEIGHT + BUBBLE_SIZE)
+
+	simulation = FixedStep(1 / FPS, simulation_step)
+
+	frame_times = []
+	hit_times = []
+	track_times = []
+	popped = 0
+	pop_debt = 0.0
+	track_debt = 0.0
+	now = 0.0
+	for _ in range(int(duration * FPS)):
+		start = perf_counter()
+		now += 1 / FPS
+
+		spawner.advance(1 / FPS, len(field), field)
+		simulation.advance(1 / FPS, now)
+		field.interpolate(simulation.alpha(now))
+
+		pop_debt += pops / FPS
+		while pop_debt >= 1:
+			pop_debt -= 1
+			x = int(rng.integers(0, SCREEN_WIDTH))
+			y = int(rng.integers(0, SCREEN_HEIGHT))
+			hit_start = perf_counter()
+			index = field.hit(x, y)
+			hit_times.append((perf_counter() - hit_start) * 1e6)
+			if index >= 0:
+				field.remove(index)
+				effects.shake('screen', 2, 2, 0.1)
+				popped += 1
+
+		effects.tick(1 / FPS)
+
+		track_debt += tracks / FPS
+		while track_debt >= 1:
+			track_debt -= 1
+			track_start = perf_counter()
+			next(sources)
+			track_times.append((perf_counter() - track_start) * 1e6)
+
+		frame_times.append((perf_counter() - start) * 1000)
+
+	playlist.close()
+	return {
+		'frames': len(frame_times),
+		'frame_ms': percentiles(frame_times),
+		'hit_test_us': percentiles(hit_times),
+		'popped': popped,
+		'live_bubbles': len(field),
+		'track_change_us': percentiles(track_times)
+	}
+
+
+def main() -> None:
+	parser = ArgumentParser(description = 'Headless simulation benchmark.')
+	parser.add_argument('scenarios', nargs = '*', help = 'scenarios to run (default: all)')
+	parser.add_argument('--seed', type = int, default = 0)
+	parser.add_argument('--list', action = 'store_true', help = 'list the scenarios and exit')
+	parser.add_argument('--no-alloc', action = 'store_true', help = 'skip the allocation tracing pass')
+	overrides = parser.add_argument_group('scenario parameters', 'override the parameters of the selected scenarios')
+	overrides.add_argument('--duration', type = float, help = 'simulated seconds')
+	overrides.add_argument('--profile', choices = PROFILES, help = 'spawner profile')
+	overrides.add_argument('--bubbles', type = int, help = 'cap on live bubbles')
+	overrides.add_argument('--pops', type = float, help = 'pops per second')
+	overrides.add_argument('--tracks', type = float, help = 'track changes per second')
+	args = parser.parse_args()
+
+	if args.list:
+		for name, params in SCENARIOS.items():
+			print(name, dumps(params))
+		return None
+
+	changed = {name: getattr(args, name) for name in SCENARIOS['idle'] if getattr(args, name) is not None}
+	scenarios = args.scenarios or (['custom'] if changed else list(SCENARIOS))
+
+	for name in scenarios:
+		if name not in SCENARIOS and name != 'custom':
+			parser.error(f'unknown scenario: {name}')
+		params = SCENARIOS.get(name, SCENARIOS['idle']) | changed
+		result = {'scenario': name, 'seed': args.seed, **params}
+		result.update(run_scenario(**params, seed = args.seed))
+
+		# Tracing slows everything down, so allocations are measured in a separate pass
+		if not args.no_alloc:
+			tracemalloc.start()
+			run_scenario(**params, seed = args.seed)
+			current, peak = tracemalloc.get_traced_memory()
+			tracemalloc.stop()
+			result['alloc_kib'] = {'peak': peak / 1024, 'retained': current / 1024}
+
+		print(dumps(result), flush = True)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,59 @@
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing             import Any, Callable
+from time               import perf_counter
+
+from .minilogger import Console
+
+
+class AssetLoader:
+    '''
+    Loads assets on a thread pool and keeps track of how long each one took.
+
+    Jobs start as soon as they are submitted; `get()` blocks until the result
+    is there. Both the time spent in the job and the time the caller had to
+    wait for it are recorded and summarized by `report()`.
+    '''
+
+    def __init__(self, workers: int = 4) -> None:
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix = 'AssetLoader')
+        self._jobs: dict[str, Future] = {}
+        self.load_times: dict[str, float] = {}
+        self.wait_times: dict[str, float] = {}
+        self._started = perf_counter()
+
+    def _timed(self, name: str, func: Callable, args: tuple) -> Any:
+        start = perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self.load_times[name] = perf_counter() - start
+
+    def submit(self, name: str, func: Callable, *args) -> Future:
+        job = self._pool.submit(self._timed, name, func, args)
+        self._jobs[name] = job
+        return job
+
+    def done(self, name: str) -> bool:
+        return self._jobs[name].done()
+
+    def get(self, name: str) -> Any:
+        job = self._jobs[name]
+        if not job.done():
+            start = perf_counter()
+            job.result()
+            self.wait_times[name] = self.wait_times.get(name, 0) + perf_counter() - start
+        return job.result()
+
+    def report(self, stage: str) -> None:
+        '''
+        Logs the timings of every finished job not reported yet.
+        '''
+        for name, seconds in sorted(self.load_times.items(), key = lambda item: -item[1]):
+            waited = self.wait_times.get(name, 0)
+            Console.log(f'{name}: {seconds * 1000:.1f} ms (waited {waited * 1000:.1f} ms)', 'AssetLoader', 'D')
+        self.load_times.clear()
+        self.wait_times.clear()
+        Console.log(f'{stage} after {(perf_counter() - self._started) * 1000:.1f} ms', 'AssetLoader', 'I')
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait = False, cancel_futures = True)
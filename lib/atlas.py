@@ -0,0 +1,95 @@
+from pyglet.image.atlas import TextureAtlas
+from pyglet.image       import load as pgl_load_image, ImageData, TextureRegion
+from json               import load, dump
+from os                 import makedirs, stat
+from os.path            import dirname, exists
+
+from .minilogger import Console
+
+
+ATLAS_VERSION = 1
+
+
+class ImageAtlas:
+    '''
+    Packs images into a single texture.
+
+    The packed texture is cached as `<cache_path>.png` along with a
+    `<cache_path>.json` index, so later launches decode one file instead of
+    every source, until any of the sources changes.
+
+    Decoding (`decode()`, `decode_cached()`) touches no OpenGL state and may
+    run on any thread; `add()`, `add_cached()` and `bake()` must run on the
+    thread owning the GL context.
+    '''
+
+    def __init__(self, sources: dict[str, str], cache_path: str, width: int = 1024, height: int = 1024) -> None:
+        self.sources = sources
+        self.cache_path = cache_path
+        self.width = width
+        self.height = height
+        self.regions: dict[str, TextureRegion] = {}
+        self._atlas: TextureAtlas | None = None
+
+        files = {}
+        for name, path in sources.items():
+            info = stat(path)
+            files[name] = [path, info.st_size, info.st_mtime_ns]
+        self._signature = {'version': ATLAS_VERSION, 'size': [width, height], 'files': files}
+
+        self._cached_regions = None
+        try:
+            with open(f'{cache_path}.json', 'r') as file:
+                index = load(file)
+            if index.get('signature') == self._signature and exists(f'{cache_path}.png'):
+                self._cached_regions = index['regions']
+        except (OSError, ValueError):
+            pass
+
+    @property
+    def cached(self) -> bool:
+        return self._cached_regions is not None
+
+    def decode(self, name: str) -> ImageData:
+        return pgl_load_image(self.sources[name]).get_image_data()
+
+    def decode_cached(self) -> ImageData:
+        return pgl_load_image(f'{self.cache_path}.png').get_image_data()
+
+    def add_cached(self, image: ImageData) -> None:
+        texture = image.get_texture()
+        for name, box in self._cached_regions.items():
+            self.regions[name] = texture.get_region(*box)
+
+    def drop_cached(self) -> None:
+        '''
+        Stops using the cache, e.g. because its texture can't be decoded; the
+        sources have to be decoded and added instead.
+        '''
+        self._cached_regions = None
+        self.regions.clear()
+
+    def add(self, name: str, image: ImageData) -> TextureRegion:
+        if self._atlas is None:
+            self._atlas = TextureAtlas(self.width, self.height)
+        region = self._atlas.add(image, border = 1)
+        self.regions[name] = region
+        return region
+
+    def bake(self) -> None:
+        '''
+        Caches the packed texture once every source has been added.
+        '''
+        if self._atlas is None or self.regions.keys() != self.sources.keys():
+            return None
+        try:
+            makedirs(dirname(self.cache_path), exist_ok = True)
+            self._atlas.texture.save(f'{self.cache_path}.png')
+            with open(f'{self.cache_path}.json', 'w') as file:
+                dump({
+                    'signature': self._signature,
+                    'regions': {name: [r.x, r.y, r.width, r.height] for name, r in self.regions.items()}
+                }, file)
+        except Exception as exc:
+            Console.log(f'could not cache the atlas: {exc}', 'Atlas', 'W')
+        self._atlas = None
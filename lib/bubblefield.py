@@ -0,0 +1,225 @@
+from queue  import SimpleQueue, Empty
+from typing import Any
+
+import numpy as np
+
+
+class BubbleField:
+    '''
+    Structure-of-arrays storage and motion of every bubble on the screen.
+
+    Row `i` of every array describes one bubble. Bubbles rise with a constant
+    speed and sway along `sin(y * frequency) * amplitude`, the same motion the
+    old per-object `Bubble.x`/`Bubble.y` properties computed.
+
+    The simulation advances in fixed `step()`s of bubble age; `interpolate()`
+    then places the bubbles between the last two steps for rendering.
+
+    Rows move when other bubbles are removed, so anything that has to refer
+    to a bubble for longer than a frame keeps its `handle()` instead: a slot
+    number tagged with a generation, which `find()` maps back to the current
+    row, or to -1 once that bubble is gone.
+
+    `spawn()` may be called from any thread; it only puts the parameters on a
+    queue that the next `step()` drains into rows. Everything else belongs to
+    the render thread.
+    '''
+
+    def __init__(self, size: int, capacity: int = 64) -> None:
+        self.size  = size
+        self.count = 0
+
+        self.x_origin   = np.zeros(capacity, np.float64)
+        self.amplitude  = np.zeros(capacity, np.float64)
+        self.frequency  = np.zeros(capacity, np.float64)
+        self.x_shift    = np.zeros(capacity, np.float64)
+        self.speed      = np.zeros(capacity, np.float64)
+        self.age        = np.zeros(capacity, np.float64)
+        self.prev_raw_y = np.zeros(capacity, np.float64)
+        self.raw_y      = np.zeros(capacity, np.float64)
+        self.anchor     = np.zeros(capacity, np.float64)
+        self.common     = np.ones(capacity, np.bool_)
+        self.slot       = np.zeros(capacity, np.int64)
+
+        # Rendered (interpolated) positions
+        self.x = np.zeros(capacity, np.int64)
+        self.y = np.zeros(capacity, np.int64)
+
+        # Arbitrary per-row objects (e.g. sprites), moved together with the rows
+        self.payload: list[Any] = []
+
+        # Slot map behind the handles: the row of every slot, its generation, and the unused slots
+        self._slot_row: list[int] = []
+        self._generation: list[int] = []
+        self._free_slots: list[int] = []
+
+        self._pending: SimpleQueue[tuple] = SimpleQueue()
+
+    _columns = ('x_origin', 'amplitude', 'frequency', 'x_shift', 'speed', 'age', 'prev_raw_y', 'raw_y', 'anchor', 'common', 'slot', 'x', 'y')
+
+    @property
+    def capacity(self) -> int:
+        return self.x_origin.shape[0]
+
+    def __len__(self) -> int:
+        return self.count
+
+    def spawn(self, x_origin: int, amplitude: float = 150, frequency: float = 0.025, x_shift: float = 0, speed: float = 40, common: bool = True, anchor: float = 0) -> None:
+        self._pending.put((x_origin, amplitude, frequency, x_shift, speed, anchor, common))
+
+    def handle(self, row: int) -> int:
+        '''
+        Returns a handle that keeps referring to the bubble at `row` while it lives.
+        '''
+        slot = int(self.slot[row])
+        return self._generation[slot] << 32 | slot
+
+    def find(self, handle: int) -> int:
+        '''
+        Returns the current row of the bubble behind `handle`, or -1 if it is gone.
+        '''
+        slot = handle & 0xFFFFFFFF
+        if slot >= len(self._generation) or self._generation[slot] != handle >> 32:
+            return -1
+        return self._slot_row[slot]
+
+    def _take_slot(self, row: int) -> int:
+        if self._free_slots:
+            slot = self._free_slots.pop()
+            self._slot_row[slot] = row
+        else:
+            slot = len(self._slot_row)
+            self._slot_row.append(row)
+            self._generation.append(0)
+        return slot
+
+    def _grow(self, capacity: int) -> None:
+        for name in self._columns:
+            old = getattr(self, name)
+            new = np.zeros(capacity, old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def _commit_pending(self) -> range:
+        # Only what was queued before the drain started, so a busy producer can't stall the step
+        pending = []
+        for _ in range(self._pending.qsize()):
+            try:
+                pending.append(self._pending.get_nowait())
+            except Empty:
+                break
+        first = self.count
+        if not pending:
+            return range(first, first)
+
+        needed = self.count + len(pending)
+        if needed > self.capacity:
+            capacity = self.capacity
+            while capacity < needed:
+                capacity *= 2
+            self._grow(capacity)
+
+        rows = slice(first, needed)
+        (
+            self.x_origin[rows],
+            self.amplitude[rows],
+            self.frequency[rows],
+            self.x_shift[rows],
+            self.speed[rows],
+            self.anchor[rows],
+            self.common[rows]
+        ) = zip(*pending)
+        self.age[rows] = 0
+        self.raw_y[rows] = -self.size
+        self.slot[rows] = [self._take_slot(row) for row in range(first, needed)]
+        self.payload.extend([None] * len(pending))
+        self.count = needed
+        return range(first, needed)
+
+    def step(self, dt: float) -> range:
+        '''
+        Ages every bubble by `dt` seconds, then adds the pending bubbles.
+
+        Returns the range of rows added by this step.
+        '''
+        n = self.count
+        self.prev_raw_y[:n] = self.raw_y[:n]
+        self.age[:n] += dt
+        self.raw_y[:n] = self.age[:n] * self.speed[:n] - self.size
+
+        added = self._commit_pending()
+        self.prev_raw_y[added.start:added.stop] = self.raw_y[added.start:added.stop]
+        return added
+
+    def interpolate(self, alpha: float) -> None:
+        '''
+        Places the bubbles `alpha` of the way from the previous step to the last one.
+        '''
+        n = self.count
+        prev = self.prev_raw_y[:n]
+        y = np.trunc(prev + (self.raw_y[:n] - prev) * alpha)
+        self.y[:n] = y
+        self.x[:n] = np.trunc(np.sin(y * self.frequency[:n]) * self.amplitude[:n]) + self.x_shift[:n] * y + self.x_origin[:n]
+
+    def remove(self, index: int) -> Any:
+        '''
+        Removes a row by moving the last row into its place.
+
+        Returns the payload of the removed row.
+        '''
+        last = self.count - 1
+        payload = self.payload[index]
+
+        slot = int(self.slot[index])
+        self._slot_row[slot] = -1
+        self._generation[slot] += 1
+        self._free_slots.append(slot)
+        if index != last:
+            self._slot_row[int(self.slot[last])] = index
+
+        if index != last:
+            for name in self._columns:
+                arr = getattr(self, name)
+                arr[index] = arr[last]
+            self.payload[index] = self.payload[last]
+        self.payload.pop()
+        self.count = last
+        return payload
+
+    def cull(self, y_limit: int) -> list[Any]:
+        '''
+        Removes every bubble at or above `y_limit` and returns their payloads.
+        '''
+        gone = np.flatnonzero(self.raw_y[:self.count] >= y_limit)
+        return [self.remove(int(i)) for i in gone[::-1]]
+
+    def max_speed(self) -> float:
+        '''
+        Returns the highest on-screen speed a bubble can reach, in pixels per second.
+        '''
+        n = self.count
+        if not n:
+            return 0.0
+        sway = self.amplitude[:n] * self.frequency[:n] + np.abs(self.x_shift[:n])
+        return float(np.max(self.speed[:n] * np.hypot(1, sway)))
+
+    def uncommon(self) -> list[int]:
+        '''
+        Returns the rows of the bubbles that turned out to be companion cubes.
+        '''
+        return np.flatnonzero(~self.common[:self.count]).tolist()
+
+    def hit(self, x: int, y: int) -> int:
+        '''
+        Returns the row of a bubble under the point, or -1.
+
+        One vectorized pass over every bubble; up to a few thousand bubbles this
+        is cheaper than keeping any spatial index up to date with the motion.
+        '''
+        n = self.count
+        left   = self.x[:n] - self.anchor[:n]
+        bottom = self.y[:n] - self.anchor[:n]
+        hits = np.flatnonzero((x > left) & (x < left + self.size) & (y > bottom) & (y < bottom + self.size))
+        if not hits.size:
+            return -1
+        return int(hits[-1])
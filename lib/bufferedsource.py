@@ -0,0 +1,42 @@
+from pyglet.media.codecs.base import Source, StreamingSource, AudioData
+from collections              import deque
+
+
+class BufferedSource(StreamingSource):
+    '''
+    Streaming source with the first `head_bytes` of audio decoded up front.
+
+    The head is decoded by the constructor, which may run on a worker thread;
+    once the player has used it up, the rest is streamed from `source` as
+    usual. This keeps the start of a track instant without holding all of it
+    in memory the way `StaticSource` does.
+    '''
+
+    def __init__(self, source: Source, head_bytes: int) -> None:
+        self._source = source.get_queue_source()
+        self.audio_format = self._source.audio_format
+        self.video_format = None
+        self.info = self._source.info
+        self._duration = self._source.duration
+
+        self._head: deque[AudioData] = deque()
+        buffered = 0
+        while self.audio_format is not None and buffered < head_bytes:
+            audio_data = self._source.get_audio_data(min(head_bytes - buffered, 1 << 16))
+            if audio_data is None:
+                break
+            self._head.append(audio_data)
+            buffered += audio_data.length
+
+    def get_audio_data(self, num_bytes: int, compensation_time: float = 0.0) -> AudioData | None:
+        if self._head:
+            return self._head.popleft()
+        return self._source.get_audio_data(num_bytes)
+
+    def seek(self, timestamp: float) -> None:
+        self._head.clear()
+        self._source.seek(timestamp)
+
+    def delete(self) -> None:
+        self._head.clear()
+        self._source.delete()
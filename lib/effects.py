@@ -0,0 +1,82 @@
+from random import Random
+
+
+class Shake:
+    __slots__ = ('channel', 'x_amplitude', 'y_amplitude', 'remaining')
+
+    def __init__(self) -> None:
+        self.channel = ''
+        self.x_amplitude = 0
+        self.y_amplitude = 0
+        self.remaining = 0.0
+
+
+class EffectScheduler:
+    '''
+    Frame-driven screen effects.
+
+    `tick()` is meant to be scheduled on the pyglet clock. Effects live in a
+    fixed pool of objects; overlapping shakes of one channel are merged into a
+    single offset per tick by taking the strongest amplitude on each axis.
+    '''
+
+    def __init__(self, pool_size: int = 32, seed: int | None = None) -> None:
+        self._free = [Shake() for _ in range(pool_size)]
+        self._active: list[Shake] = []
+        self._rng = Random(seed)
+        self._offsets: dict[str, tuple[int, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._active)
+
+    def shake(self, channel: str, x_amplitude: int = 3, y_amplitude: int = 3, fx_time: float = 1) -> None:
+        # Offsets are whole pixels, and scaled amplitudes (e.g. by a quality tier) needn't be
+        x_amplitude = round(x_amplitude)
+        y_amplitude = round(y_amplitude)
+        if not (x_amplitude or y_amplitude):
+            return None
+
+        if self._free:
+            fx = self._free.pop()
+        else:
+            # The pool is exhausted: take over the effect that is about to end anyway
+            fx = min(self._active, key = lambda active: active.remaining)
+            self._active.remove(fx)
+
+        fx.channel = channel
+        fx.x_amplitude = x_amplitude
+        fx.y_amplitude = y_amplitude
+        fx.remaining = fx_time
+        self._active.append(fx)
+
+    def offset(self, channel: str) -> tuple[int, int]:
+        return self._offsets.get(channel, (0, 0))
+
+    def _pick(self, amplitude: int, previous: int) -> int:
+        if not amplitude:
+            return 0
+        if not -amplitude <= previous <= amplitude:
+            return self._rng.randint(-amplitude, amplitude)
+        # Same as the old thread-based shake: never stay on the previous offset
+        value = self._rng.randint(-amplitude, amplitude - 1)
+        return value + 1 if value >= previous else value
+
+    def tick(self, dt: float) -> None:
+        amplitudes: dict[str, tuple[int, int]] = {}
+        still_active = []
+        for fx in self._active:
+            ax, ay = amplitudes.get(fx.channel, (0, 0))
+            amplitudes[fx.channel] = (max(ax, fx.x_amplitude), max(ay, fx.y_amplitude))
+            fx.remaining -= dt
+            if fx.remaining > 0:
+                still_active.append(fx)
+            else:
+                self._free.append(fx)
+        self._active = still_active
+
+        offsets = {}
+        for channel in sorted(amplitudes):
+            x, y = self.offset(channel)
+            ax, ay = amplitudes[channel]
+            offsets[channel] = (self._pick(ax, x), self._pick(ay, y))
+        self._offsets = offsets
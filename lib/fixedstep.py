@@ -0,0 +1,43 @@
+from typing import Callable
+
+
+class FixedStep:
+    '''
+    Runs a callback in fixed steps of simulated time.
+
+    Real time is accumulated by `advance()` and spent in whole steps; the
+    remainder is exposed through `alpha()` so that rendering can interpolate
+    between the last two steps.
+    '''
+
+    def __init__(self, step: float, callback: Callable[[float], None], max_steps: int = 5) -> None:
+        self.step = step
+        self.callback = callback
+        self.max_steps = max_steps
+        self.accumulator = 0.0
+        # Steps run since the start
+        self.steps = 0
+        self._stamp = 0.0
+
+    def advance(self, dt: float, now: float) -> int:
+        '''
+        Accumulates `dt` seconds that ended at `now` and runs the due steps.
+
+        At most `max_steps` are run per call; a longer hitch is dropped
+        instead of being caught up with, so one slow frame can't snowball.
+        '''
+        self.accumulator += dt
+        self._stamp = now
+        steps = 0
+        while self.accumulator >= self.step:
+            if steps == self.max_steps:
+                self.accumulator = 0.0
+                break
+            self.callback(self.step)
+            self.accumulator -= self.step
+            self.steps += 1
+            steps += 1
+        return steps
+
+    def alpha(self, now: float) -> float:
+        return min(1.0, (self.accumulator + now - self._stamp) / self.step)
@@ -0,0 +1,50 @@
+from math   import ceil
+from typing import Any
+
+
+def check_rates(min_fps: Any, max_fps: Any) -> None:
+    '''
+    Raises ValueError unless `1 <= min_fps <= max_fps`.
+    '''
+    if not all(type(fps) in (int, float) for fps in (min_fps, max_fps)) or not 1 <= min_fps <= max_fps:
+        raise ValueError(f'need 1 <= min_fps <= max_fps, not {min_fps!r} and {max_fps!r}')
+
+
+class FramePacer:
+    '''
+    Picks how often the window has to be redrawn.
+
+    While something needs a smooth picture (input, pops, running effects)
+    and for `hold` seconds after it, frames come at `max_fps`. Otherwise the
+    rate is the one that keeps the fastest bubble within `max_step` pixels
+    per frame, rounded up to a multiple of 10 FPS (so that not every spawned
+    bubble reschedules the frames) and clamped to `[min_fps, max_fps]`. With
+    `enabled` false the pacer always asks for `max_fps`.
+    '''
+
+    def __init__(self, max_fps: int = 60, min_fps: int = 20, max_step: float = 6, hold: float = 1) -> None:
+        check_rates(min_fps, max_fps)
+        self.max_fps = max_fps
+        self.min_fps = min_fps
+        self.max_step = max_step
+        self.hold = hold
+        self.enabled = True
+        self._awake_until = 0.0
+
+    def wake(self, now: float) -> None:
+        '''
+        Requests the full rate for the next `hold` seconds.
+        '''
+        self._awake_until = now + self.hold
+
+    def rate(self, now: float, max_speed: float, busy: bool = False) -> int:
+        '''
+        Returns the frame rate for the current scene.
+
+        `max_speed` is the on-screen speed of the fastest bubble in pixels per
+        second; `busy` forces the full rate, e.g. while an effect runs.
+        '''
+        if not self.enabled or busy or now < self._awake_until:
+            return self.max_fps
+        needed = ceil(max_speed / self.max_step / 10) * 10
+        return max(self.min_fps, min(self.max_fps, needed))
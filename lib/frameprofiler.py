@@ -0,0 +1,87 @@
+from array     import array
+from functools import wraps
+from typing    import Callable
+from time      import perf_counter
+
+
+class _Phase:
+    __slots__ = ('profiler', 'samples', 'index', 'filled', 'start')
+
+    def __init__(self, profiler: 'FrameProfiler', capacity: int) -> None:
+        self.profiler = profiler
+        self.samples = array('d', bytes(8 * capacity))
+        self.index = 0
+        self.filled = 0
+        self.start = 0.0
+
+    def add(self, seconds: float) -> None:
+        self.samples[self.index] = seconds
+        self.index = (self.index + 1) % len(self.samples)
+        self.filled = min(self.filled + 1, len(self.samples))
+
+    def __enter__(self) -> None:
+        self.start = perf_counter()
+
+    def __exit__(self, *exc) -> None:
+        if self.profiler.enabled:
+            self.add(perf_counter() - self.start)
+
+
+class _Idle:
+    def __enter__(self) -> None: ...
+    def __exit__(self, *exc) -> None: ...
+
+
+_idle = _Idle()
+
+
+class FrameProfiler:
+    '''
+    Times named phases into fixed-size ring buffers.
+
+    Nothing is timed while `enabled` is false. Percentiles are only computed
+    on request, so collecting costs two clock reads per phase.
+    '''
+
+    def __init__(self, capacity: int = 240) -> None:
+        self.capacity = capacity
+        self.enabled = False
+        self._phases: dict[str, _Phase] = {}
+
+    def _get(self, name: str) -> _Phase:
+        phase = self._phases.get(name)
+        if phase is None:
+            phase = self._phases[name] = _Phase(self, self.capacity)
+        return phase
+
+    def phase(self, name: str) -> _Phase | _Idle:
+        '''
+        Context manager timing the enclosed block as the phase `name`.
+        '''
+        if not self.enabled:
+            return _idle
+        return self._get(name)
+
+    def wrap(self, name: str, func: Callable) -> Callable:
+        '''
+        Wraps e.g. a clock callback so that every call is timed as the phase `name`.
+        '''
+        @wraps(func)
+        def timed(*args, **kwargs):
+            with self.phase(name):
+                return func(*args, **kwargs)
+        return timed
+
+    def percentiles(self, name: str, points: tuple[float, ...] = (50, 95, 99)) -> list[float]:
+        phase = self._phases.get(name)
+        if phase is None or not phase.filled:
+            return [0.0 for _ in points]
+        ordered = sorted(phase.samples[:phase.filled])
+        return [ordered[min(len(ordered) - 1, int(len(ordered) * point / 100))] for point in points]
+
+    def summary(self) -> str:
+        lines = [f'{"phase":<16}{"p50":>8}{"p95":>8}{"p99":>8}  ms']
+        for name in self._phases:
+            p50, p95, p99 = self.percentiles(name)
+            lines.append(f'{name:<16}{p50 * 1000:>8.2f}{p95 * 1000:>8.2f}{p99 * 1000:>8.2f}')
+        return '\n'.join(lines)
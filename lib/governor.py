@@ -0,0 +1,70 @@
+# From the best looking tier to the cheapest one. `max_bubbles` caps the live
+# bubbles (None: the spawner profile's cap), `effects` scales the screen shake,
+# `spawn_rate` scales the spawner's rate and `render_scale` caps the scale
+# the bubbles are rendered at.
+TIERS = (
+    {'name': 'high',    'max_bubbles': None, 'effects': 1.0,  'spawn_rate': 1.0,  'render_scale': 1.0,  'rotate_cubes': True},
+    {'name': 'medium',  'max_bubbles': 2000, 'effects': 0.5,  'spawn_rate': 0.75, 'render_scale': 0.85, 'rotate_cubes': True},
+    {'name': 'low',     'max_bubbles': 800,  'effects': 0.25, 'spawn_rate': 0.5,  'render_scale': 0.7,  'rotate_cubes': False},
+    {'name': 'minimal', 'max_bubbles': 300,  'effects': 0.0,  'spawn_rate': 0.25, 'render_scale': 0.5,  'rotate_cubes': False}
+)
+
+
+class QualityGovernor:
+    '''
+    Moves through quality tiers to hold a frame-time budget.
+
+    Frame times are judged in windows of `window` frames. A window whose p95
+    is over `budget_ms` drops one tier right away. Going back up takes
+    `patience` windows in a row with the p95 under `recover` of the budget,
+    so a tier that only just fits doesn't bounce between two tiers.
+    '''
+
+    def __init__(self, budget_ms: float = 16.6, recover: float = 0.7, window: int = 120, patience: int = 3, tiers: tuple[dict, ...] = TIERS) -> None:
+        self.budget_ms = budget_ms
+        self.recover = recover
+        self.window = window
+        self.patience = patience
+        self.tiers = tiers
+        self.level = 0
+        self.p95 = 0.0
+        self._samples: list[float] = []
+        self._good_windows = 0
+
+    @property
+    def tier(self) -> dict:
+        return self.tiers[self.level]
+
+    def reset(self) -> None:
+        self.level = 0
+        self._samples.clear()
+        self._good_windows = 0
+
+    def record(self, frame_ms: float) -> dict | None:
+        '''
+        Adds one frame time. Returns the new tier if it changed, otherwise None.
+        '''
+        self._samples.append(frame_ms)
+        if len(self._samples) < self.window:
+            return None
+
+        ordered = sorted(self._samples)
+        self.p95 = ordered[int(len(ordered) * 0.95)]
+        self._samples.clear()
+
+        if self.p95 > self.budget_ms:
+            self._good_windows = 0
+            if self.level + 1 < len(self.tiers):
+                self.level += 1
+                return self.tier
+            return None
+
+        if self.p95 < self.budget_ms * self.recover and self.level > 0:
+            self._good_windows += 1
+            if self._good_windows >= self.patience:
+                self._good_windows = 0
+                self.level -= 1
+                return self.tier
+        else:
+            self._good_windows = 0
+        return None
@@ -1,4 +1,9 @@
-from types import SimpleNamespace
+from types     import SimpleNamespace
+from threading import Thread, Lock, Event
+from queue     import SimpleQueue
+from time      import time, strftime, localtime
+
+from .rotating import RotatingFile
 
 try:
     from colorama import Fore, Back, Style
@@ -45,17 +50,85 @@ scheme = {
     }
 }
 
+# Verbosity of every level, under both letter cases
+_verbosity = {letter: info['level'] for letter, info in scheme.items()} | {letter.lower(): info['level'] for letter, info in scheme.items()}
+
+
 class Console:
+    '''
+    Non-blocking console logger.
+
+    `log()` drops records below `level` right away and only queues the rest;
+    a background thread formats and prints them, and writes them to the
+    file sink if one is set. `drain()` waits until everything queued so far
+    has been written.
+    '''
+
     level = 'D'
 
+    _queue: SimpleQueue = SimpleQueue()
+    _thread: Thread | None = None
+    _start_lock = Lock()
+    _sink: RotatingFile | None = None
+
     @classmethod
     def log(cls, message: str, source: str = 'main', level: str = 'I'):
-        level = level.upper()
+        if _verbosity[cls.level] < _verbosity[level]:
+            return None
 
-        if scheme[cls.level.upper()]['level'] < scheme[level]['level']:
+        cls._queue.put((time(), level.upper(), source, message))
+        if cls._thread is None:
+            cls._start()
+
+    @classmethod
+    def set_file_sink(cls, path: str, max_bytes: int = 1024 * 1024, backups: int = 3):
+        cls._queue.put(RotatingFile(path, max_bytes, backups))
+        if cls._thread is None:
+            cls._start()
+
+    @classmethod
+    def drain(cls, timeout: float | None = None):
+        if cls._thread is None:
             return None
+        done = Event()
+        cls._queue.put(done)
+        done.wait(timeout)
+
+    @classmethod
+    def _start(cls):
+        with cls._start_lock:
+            if cls._thread is not None:
+                return None
+            cls._thread = Thread(
+                target = cls._writer,
+                args   = (),
+                name   = 'ConsoleWriterThread',
+                daemon = True
+            )
+            cls._thread.start()
+
+    @classmethod
+    def _writer(cls):
+        while True:
+            record = cls._queue.get()
+
+            if isinstance(record, Event):
+                if cls._sink is not None:
+                    cls._sink.flush()
+                record.set()
+                continue
+
+            if isinstance(record, RotatingFile):
+                if cls._sink is not None:
+                    cls._sink.close()
+                cls._sink = record
+                continue
 
-        print(f'{scheme[level]["fore"]}{scheme[level]["back"]}{scheme[level]["description"]}{Style.RESET_ALL} \t{scheme[level]["fore"]}{scheme[level]["back"]}{source}{Style.RESET_ALL} \t{scheme[level]["fore"]}{scheme[level]["back"]}{message}{Style.RESET_ALL}')
+            timestamp, level, source, message = record
+            style = scheme[level]["fore"] + scheme[level]["back"]
+            print(f'{style}{scheme[level]["description"]}{Style.RESET_ALL} \t{style}{source}{Style.RESET_ALL} \t{style}{message}{Style.RESET_ALL}')
+            if cls._sink is not None:
+                cls._sink.write(f'{strftime("%Y-%m-%d %H:%M:%S", localtime(timestamp))} {scheme[level]["description"]}\t{source}\t{message}\n')
 
 print()
 
@@ -64,4 +137,5 @@ if __name__ == '__main__':
     Console.log('second test message', 'minilogger', 'I')
     Console.log('third test message', 'minilogger', 'W')
     Console.log('fourth test message', 'minilogger', 'E')
-    Console.log('fifth test message', 'minilogger', 'F')
\ No newline at end of file
+    Console.log('fifth test message', 'minilogger', 'F')
+    Console.drain()
\ No newline at end of file
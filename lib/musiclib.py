@@ -0,0 +1,97 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing             import Callable
+from json               import load, dump
+from os                 import scandir, replace, makedirs
+from os.path            import dirname, splitext
+
+from .minilogger import Console
+
+
+INDEX_VERSION = 1
+
+
+class MusicLibrary:
+    '''
+    Persistent index of a music folder.
+
+    Every file is identified by its name, size and mtime. Files whose entry
+    in the index is still valid are not opened again; only new and changed
+    files are handed to the `probe` callable, which returns their duration
+    and tags.
+    '''
+
+    def __init__(self, folder: str, index_path: str, meta: dict | None = None) -> None:
+        self.folder = folder.rstrip('/')
+        self.index_path = index_path
+        self.meta = meta or {}
+        self.tracks: list[dict] = []
+
+    def _read_index(self) -> dict:
+        try:
+            with open(self.index_path, 'r', encoding = 'utf-8') as file:
+                index = load(file)
+        except (OSError, ValueError):
+            return {}
+        if index.get('version') != INDEX_VERSION:
+            return {}
+        return index['files']
+
+    def _write_index(self, files: dict) -> None:
+        makedirs(dirname(self.index_path), exist_ok = True)
+        with open(f'{self.index_path}.tmp', 'w', encoding = 'utf-8') as file:
+            dump({'version': INDEX_VERSION, 'files': files}, file)
+        replace(f'{self.index_path}.tmp', self.index_path)
+
+    def display_name(self, fname: str, tags: dict) -> str:
+        if fname in self.meta:
+            return self.meta[fname]['name']
+        if tags.get('author') and tags.get('title'):
+            return f'{tags["author"]} - {tags["title"]}'
+        if tags.get('title'):
+            return tags['title']
+        return splitext(fname)[0].replace('_', ' ')
+
+    def refresh(self, probe: Callable[[str], dict], workers: int = 4) -> None:
+        '''
+        Brings the index up to date with the folder and rebuilds `tracks`.
+        '''
+        old = self._read_index()
+        files = {}
+        stale = []
+        for entry in scandir(self.folder):
+            if not entry.is_file():
+                continue
+            info = entry.stat()
+            cached = old.get(entry.name)
+            if cached and cached['size'] == info.st_size and cached['mtime'] == info.st_mtime_ns:
+                files[entry.name] = cached
+            else:
+                files[entry.name] = {'size': info.st_size, 'mtime': info.st_mtime_ns}
+                stale.append(entry.name)
+
+        def probe_one(fname: str) -> dict:
+            try:
+                return {'playable': True, **probe(f'{self.folder}/{fname}')}
+            except Exception as exc:
+                Console.log(f'"{self.folder}/{fname}" can not be played: {exc}', 'MusicLibrary', 'W')
+                return {'playable': False}
+
+        if stale:
+            with ThreadPoolExecutor(workers, thread_name_prefix = 'MusicProbe') as pool:
+                for fname, probed in zip(stale, pool.map(probe_one, stale)):
+                    files[fname].update(probed)
+        if stale or files.keys() != old.keys():
+            self._write_index(files)
+        Console.log(f'{len(files)} files indexed, {len(stale)} probed', 'MusicLibrary', 'I')
+
+        self.tracks = []
+        for fname in sorted(files):
+            entry = files[fname]
+            if not entry['playable']:
+                continue
+            self.tracks.append({
+                'path':     f'{self.folder}/{fname}',
+                'name':     self.display_name(fname, entry['tags']),
+                'duration': entry['duration'],
+                'tags':     entry['tags']
+            })
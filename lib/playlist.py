@@ -0,0 +1,89 @@
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing             import Any, Callable, Iterator
+from random             import Random
+
+
+def _discard(job: Future) -> None:
+    if job.exception() is None and hasattr(job.result(), 'delete'):
+        job.result().delete()
+
+
+class Playlist:
+    '''
+    Looped playlist that opens the next track ahead of time.
+
+    As soon as a track is handed to the player, the one after it is picked and
+    opened by `opener` on a worker thread, so that it is ready to play when
+    the current one ends or is skipped. Only one track is prefetched at a
+    time. The player never waits for it: the first track, and any track
+    asked for before its prefetch is done, is opened by the cheap `fallback`
+    instead (e.g. plain streaming).
+    '''
+
+    def __init__(self, tracks: list[dict], opener: Callable[[dict], Any], fallback: Callable[[dict], Any], shuffle: Callable[[], bool], rng: Random | None = None) -> None:
+        self.tracks = tracks
+        self.opener = opener
+        self.fallback = fallback
+        self.shuffle = shuffle
+        self.rng = rng or Random()
+        self.selected = 0
+        # Times a track was not prefetched yet and had to be opened by the fallback
+        self.misses = 0
+        self._pool = ThreadPoolExecutor(1, thread_name_prefix = 'TrackPrefetch')
+        self._next: tuple[int, Future] | None = None
+
+    @property
+    def current(self) -> dict:
+        return self.tracks[self.selected]
+
+    def _pick(self) -> int:
+        if self.shuffle():
+            next_track = self.rng.randint(0, len(self.tracks) - 1)
+            while next_track == self.selected:
+                next_track = self.rng.randint(0, len(self.tracks) - 1)
+            return next_track
+        return (self.selected + 1) % len(self.tracks)
+
+    def prefetch(self) -> None:
+        if self._next is None:
+            index = self._pick()
+            self._next = (index, self._pool.submit(self.opener, self.tracks[index]))
+
+    def _drop(self) -> None:
+        _, job = self._next
+        self._next = None
+        if not job.cancel():
+            job.add_done_callback(_discard)
+
+    def invalidate(self) -> None:
+        '''
+        Drops the prefetched track, e.g. because the playback order changed.
+        '''
+        if self._next is None:
+            return None
+        self._drop()
+        self.prefetch()
+
+    def sources(self) -> Iterator[Any]:
+        '''
+        Generator of opened tracks for `Player.queue()`.
+        '''
+        while True:
+            if self._next is None:
+                index = self._pick()
+                source = self.fallback(self.tracks[index])
+            elif self._next[1].done():
+                index, job = self._next
+                self._next = None
+                source = job.result()
+            else:
+                index = self._next[0]
+                self._drop()
+                self.misses += 1
+                source = self.fallback(self.tracks[index])
+            self.selected = index
+            self.prefetch()
+            yield source
+
+    def close(self) -> None:
+        self._pool.shutdown(wait = False, cancel_futures = True)
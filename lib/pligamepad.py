@@ -4,7 +4,14 @@
 
 
 from threading import Thread
-from inputs    import get_gamepad, InputEvent
+from typing    import NamedTuple
+from queue     import SimpleQueue, Empty
+from platform  import system
+from struct    import Struct, unpack
+from math      import hypot
+from glob      import glob
+from time      import sleep, monotonic
+import os
 
 
 class EventType:
@@ -16,147 +23,236 @@ class EventType:
 STK_ABS_LIM = 32767
 TRG_ABS_LIM = 1023
 
+# Digital state of the analog triggers
+TRIGGER_THRESHOLD = 0.5
+
+# A deadzone of 1 or more would swallow the whole stick travel
+MAX_DEADZONE = 0.95
+
+# Seconds between two scans for plugged and unplugged devices
+RESCAN_INTERVAL = 1
+
+BUTTONS = {
+    'BTN_TL':     'LB',
+    'BTN_TR':     'RB',
+    'BTN_MODE':   'MODE',
+    'BTN_SELECT': 'SELECT',
+    'BTN_START':  'START',
+    'BTN_SOUTH':  'A',
+    'BTN_EAST':   'B',
+    'BTN_NORTH':  'X',
+    'BTN_WEST':   'Y',
+    'BTN_THUMBL': 'LS',
+    'BTN_THUMBR': 'RS'
+}
+
+AXES = ('ABS_X', 'ABS_Y', 'ABS_RX', 'ABS_RY', 'ABS_Z', 'ABS_RZ', 'ABS_HAT0X', 'ABS_HAT0Y')
+
+# Linux input event codes (linux/input-event-codes.h)
+EV_SYN, EV_KEY, EV_ABS = 0x00, 0x01, 0x03
+SYN_REPORT = 0
+KEY_MAX = 0x2ff
+BTN_GAMEPAD = 0x130
+EVDEV_KEYS = {
+    0x130: 'BTN_SOUTH',
+    0x131: 'BTN_EAST',
+    0x133: 'BTN_NORTH',
+    0x134: 'BTN_WEST',
+    0x136: 'BTN_TL',
+    0x137: 'BTN_TR',
+    0x13a: 'BTN_SELECT',
+    0x13b: 'BTN_START',
+    0x13c: 'BTN_MODE',
+    0x13d: 'BTN_THUMBL',
+    0x13e: 'BTN_THUMBR'
+}
+EVDEV_AXES = {
+    0x00: 'ABS_X',
+    0x01: 'ABS_Y',
+    0x02: 'ABS_Z',
+    0x03: 'ABS_RX',
+    0x04: 'ABS_RY',
+    0x05: 'ABS_RZ',
+    0x10: 'ABS_HAT0X',
+    0x11: 'ABS_HAT0Y'
+}
+
+
+class Stick(NamedTuple):
+    x: float = 0.0
+    y: float = 0.0
 
-class Stick:
-
-    def __init__(self) -> None:
-        self._x: float = 0.0
-        self._y: float = 0.0
-
-    @property
-    def x(self) -> float:
-        return self._x
-    @property
-    def y(self) -> float:
-        return self._y
-    
-    @x.setter
-    def x(self, value: int) -> None:
-        self._x = max(-1.0, min(1.0, value / STK_ABS_LIM))
-    @y.setter
-    def y(self, value: int) -> None:
-        self._y = max(-1.0, min(1.0, value / STK_ABS_LIM))
-    
     def __bool__(self) -> bool:
-        return self._x > 0.01 or self._y > 0.01
-    
-    def __repr__(self) -> str:
-        return f'({self.x}, {self.y})'
-
-
-class Trigger:
-
-    def __init__(self) -> None:
-        self._value: float = 0.0
-
-    @property
-    def value(self) -> float:
-        return self._value
-    
-    @value.setter
-    def value(self, value: int) -> None:
-        self._value = min(1.0, value / TRG_ABS_LIM)
+        return abs(self.x) > 0.01 or abs(self.y) > 0.01
 
-    def __bool__(self) -> bool:
-        return self._value > 0.01
-    
-    def __repr__(self) -> str:
-        return f'{self.value}'
-
-
-class Key:
-
-    def __init__(self) -> None:
-        self._state: bool = False
-
-    @property
-    def state(self) -> bool:
-        return self._state
-    
-    def __bool__(self) -> bool:
-        return self.state
-    
-    def __repr__(self) -> str:
-        return str(bool(self))
-    
-
-class DPad:
-
-    def __init__(self) -> None:
-        self._x: int = 0
-        self._y: int = 0
-
-    @property
-    def x(self) -> int:
-        return self._x
-    @property
-    def y(self) -> int:
-        return self._y
-    
-    def __bool__(self) -> bool:
-        return self._x > 1 or self._y > 1
-    
     def __repr__(self) -> str:
         return f'({self.x}, {self.y})'
 
 
-class StickSet:
-    def __init__(self) -> None:
-        self.left  = Stick()
-        self.right = Stick()
-
+class GamepadState(NamedTuple):
+    '''
+    Immutable snapshot of one gamepad.
+
+    `buttons` holds the names of the pressed buttons; the triggers count as
+    the `LT`/`RT` buttons once pressed past `TRIGGER_THRESHOLD`.
+    '''
+    pad:           int = -1
+    buttons:       frozenset[str] = frozenset()
+    left:          Stick = Stick()
+    right:         Stick = Stick()
+    left_trigger:  float = 0.0
+    right_trigger: float = 0.0
+    dpad:          tuple[int, int] = (0, 0)
+
+
+class GamepadEvent(NamedTuple):
+    pad:     int
+    button:  str
+    pressed: bool
+
+
+def _apply_deadzone(x: float, y: float, deadzone: float) -> Stick:
+    magnitude = hypot(x, y)
+    if magnitude <= deadzone:
+        return Stick()
+    scale = min(1.0, (magnitude - deadzone) / (1 - deadzone)) / magnitude
+    return Stick(x * scale, y * scale)
+
+
+class _Pad:
+    '''
+    Working state of one device, turned into snapshots on every report.
+    '''
+
+    def __init__(self, pad: int, ranges: dict[str, tuple[int, int]]) -> None:
+        self.pad = pad
+        self.ranges = ranges
+        self.buttons: set[str] = set()
+        self.axes: dict[str, float] = dict.fromkeys(AXES, 0.0)
+
+    def key(self, code: str, value: int) -> None:
+        if code not in BUTTONS:
+            return None
+        if value:
+            self.buttons.add(BUTTONS[code])
+        else:
+            self.buttons.discard(BUTTONS[code])
+
+    def axis(self, code: str, value: int) -> None:
+        if code not in self.ranges:
+            return None
+        low, high = self.ranges[code]
+        if code in ('ABS_Z', 'ABS_RZ'):
+            self.axes[code] = max(0.0, min(1.0, (value - low) / (high - low)))
+        elif code in ('ABS_HAT0X', 'ABS_HAT0Y'):
+            self.axes[code] = value
+        else:
+            middle = (low + high) / 2
+            self.axes[code] = max(-1.0, min(1.0, (value - middle) / (high - middle)))
+
+    def snapshot(self, deadzone: float) -> GamepadState:
+        buttons = set(self.buttons)
+        if self.axes['ABS_Z'] > TRIGGER_THRESHOLD:
+            buttons.add('LT')
+        if self.axes['ABS_RZ'] > TRIGGER_THRESHOLD:
+            buttons.add('RT')
+        return GamepadState(
+            pad           = self.pad,
+            buttons       = frozenset(buttons),
+            left          = _apply_deadzone(self.axes['ABS_X'], self.axes['ABS_Y'], deadzone),
+            right         = _apply_deadzone(self.axes['ABS_RX'], self.axes['ABS_RY'], deadzone),
+            left_trigger  = self.axes['ABS_Z'],
+            right_trigger = self.axes['ABS_RZ'],
+            dpad          = (int(self.axes['ABS_HAT0X']), int(self.axes['ABS_HAT0Y']))
+        )
 
-class ThumbSet:
-    def __init__(self) -> None:
-        self.left  = Key()
-        self.right = Key()
 
+# Ranges the `inputs` library reports on platforms without evdev
+DEFAULT_RANGES = {
+    'ABS_X':     (-STK_ABS_LIM, STK_ABS_LIM),
+    'ABS_Y':     (-STK_ABS_LIM, STK_ABS_LIM),
+    'ABS_RX':    (-STK_ABS_LIM, STK_ABS_LIM),
+    'ABS_RY':    (-STK_ABS_LIM, STK_ABS_LIM),
+    'ABS_Z':     (0, TRG_ABS_LIM),
+    'ABS_RZ':    (0, TRG_ABS_LIM),
+    'ABS_HAT0X': (-1, 1),
+    'ABS_HAT0Y': (-1, 1)
+}
 
-class KeySet:
-    def __init__(self) -> None:
-        self.mode   = Key()
-        self.select = Key()
-        self.start  = Key()
-        self.a      = Key()
-        self.b      = Key()
-        self.x      = Key()
-        self.y      = Key()
 
+class GamepadListener:
+    '''
+    Reads every connected gamepad on a background thread.
 
-class BumperSet:
-    def __init__(self) -> None:
-        self.left  = Key()
-        self.right = Key()
+    On Linux the evdev devices are multiplexed with `selectors` and rescanned
+    for hotplug; elsewhere the `inputs` library is used. Readers get
+    immutable `GamepadState` snapshots (`state`) and drain button
+    edges with `poll_events()`, so nothing is shared while being written.
+    '''
 
+    def __init__(self, deadzone: float = 0.0) -> None:
 
-class TriggerSet:
-    def __init__(self) -> None:
-        self.left  = Trigger()
-        self.right = Trigger()
+        self._thread = None
+        self._is_running = False
 
+        self.deadzone = deadzone
 
-class GamepadListener:
+        self._states: dict[int, GamepadState] = {}
+        self._active = -1
+        self._events: SimpleQueue[GamepadEvent] = SimpleQueue()
 
-    def __init__(self) -> None:
+    @property
+    def registered(self) -> bool:
+        '''
+        Whether any gamepad is connected.
+        '''
+        return bool(self._states)
 
-        self._thread = None
-        self._is_running = False
+    @property
+    def deadzone(self) -> float:
+        return self._deadzone
 
-        self.registered = False
+    @deadzone.setter
+    def deadzone(self, value: float) -> None:
+        self._deadzone = max(0.0, min(MAX_DEADZONE, value))
 
-        self.bumper  = BumperSet()
-        self.dpad    = DPad()
-        self.key     = KeySet()
-        self.stick   = StickSet()
-        self.thumb   = ThumbSet()
-        self.trigger = TriggerSet()
+    @property
+    def state(self) -> GamepadState:
+        '''
+        Snapshot of the gamepad used last.
+        '''
+        return self._states.get(self._active, GamepadState())
+
+    def poll_events(self) -> list[GamepadEvent]:
+        events = []
+        while True:
+            try:
+                events.append(self._events.get_nowait())
+            except Empty:
+                return events
+
+    def _publish(self, pad: _Pad) -> None:
+        new = pad.snapshot(self.deadzone)
+        old = self._states.get(pad.pad, GamepadState(pad.pad))
+        for button in new.buttons - old.buttons:
+            self._events.put(GamepadEvent(pad.pad, button, True))
+        for button in old.buttons - new.buttons:
+            self._events.put(GamepadEvent(pad.pad, button, False))
+        self._states[pad.pad] = new
+        self._active = pad.pad
+
+    def _disconnect(self, pad: _Pad) -> None:
+        pad.buttons.clear()
+        pad.axes = dict.fromkeys(AXES, 0.0)
+        self._publish(pad)
+        del self._states[pad.pad]
 
     def start(self) -> None:
 
         self._is_running = True
 
         self._thread = Thread(
-            target = self._updater,
+            target = self._evdev_updater if system() == 'Linux' else self._inputs_updater,
             args   = (),
             name   = self.__class__.__name__,
             daemon = True
@@ -167,56 +263,133 @@ class GamepadListener:
 
         self._is_running = False
 
-    def _updater(self) -> None:
+    def _evdev_updater(self) -> None:
+        from selectors import DefaultSelector, EVENT_READ
+        from fcntl     import ioctl
+
+        event_format = Struct('llHHi')
+        selector = DefaultSelector()
+        devices: dict[str, tuple[int, _Pad]] = {}
+        # Event devices already found not to be gamepads (keyboards, mice...)
+        ignored: set[str] = set()
+        next_pad = 0
+        last_scan = -RESCAN_INTERVAL
+
+        def abs_range(fd: int, code: int, name: str) -> tuple[int, int]:
+            # EVIOCGABS(code): _IOR('E', 0x40 + code, struct input_absinfo)
+            try:
+                info = ioctl(fd, (2 << 30) | (24 << 16) | (ord('E') << 8) | (0x40 + code), bytes(24))
+                _, low, high, _, _, _ = unpack('6i', info)
+                if high > low:
+                    return low, high
+            except OSError:
+                pass
+            return DEFAULT_RANGES[name]
+
+        def is_gamepad(fd: int) -> bool:
+            # EVIOCGBIT(EV_KEY): _IOR('E', 0x20 + EV_KEY, the key bitmap)
+            size = KEY_MAX // 8 + 1
+            try:
+                bits = ioctl(fd, (2 << 30) | (size << 16) | (ord('E') << 8) | (0x20 + EV_KEY), bytes(size))
+            except OSError:
+                return False
+            return bool(bits[BTN_GAMEPAD // 8] & (1 << BTN_GAMEPAD % 8))
+
+        def close(path: str) -> None:
+            fd, pad = devices.pop(path)
+            selector.unregister(fd)
+            os.close(fd)
+            self._disconnect(pad)
 
         while self._is_running:
 
-            event: InputEvent = get_gamepad()[0]
-
-            self.registered = True
+            # Hotplug: every event device that has gamepad buttons is read, whether
+            # or not udev gave it a by-id link (Bluetooth pads often lack one). Reading
+            # wakes this loop hundreds of times a second, so the scan is rate-limited.
+            if monotonic() - last_scan >= RESCAN_INTERVAL:
+                last_scan = monotonic()
+                present = set(glob('/dev/input/event*'))
+                ignored &= present
+                for path in present - devices.keys() - ignored:
+                    try:
+                        fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+                    except OSError:
+                        continue
+                    if not is_gamepad(fd):
+                        os.close(fd)
+                        ignored.add(path)
+                        continue
+                    pad = _Pad(next_pad, {name: abs_range(fd, code, name) for code, name in EVDEV_AXES.items()})
+                    next_pad += 1
+                    devices[path] = (fd, pad)
+                    selector.register(fd, EVENT_READ, path)
+                    self._publish(pad)
+                for path in devices.keys() - present:
+                    close(path)
+
+            if not devices:
+                sleep(RESCAN_INTERVAL)
+                continue
+
+            for key, _ in selector.select(timeout = RESCAN_INTERVAL):
+                path = key.data
+                fd, pad = devices[path]
+                try:
+                    data = os.read(fd, event_format.size * 64)
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    close(path)
+                    continue
+                for _, _, ev_type, code, value in event_format.iter_unpack(data[:len(data) - len(data) % event_format.size]):
+                    if ev_type == EV_KEY and code in EVDEV_KEYS:
+                        pad.key(EVDEV_KEYS[code], value)
+                    elif ev_type == EV_ABS and code in EVDEV_AXES:
+                        pad.axis(EVDEV_AXES[code], value)
+                    elif ev_type == EV_SYN and code == SYN_REPORT:
+                        self._publish(pad)
+
+        for path in list(devices):
+            close(path)
+        selector.close()
+
+    def _inputs_updater(self) -> None:
+        from inputs import get_gamepad, UnpluggedError
+
+        pad = _Pad(0, DEFAULT_RANGES)
 
-            if event.ev_type == EventType.KEY:
-
-                match event.code:
-                    case 'BTN_TL':     self.bumper.left._state  = bool(event.state)
-                    case 'BTN_TR':     self.bumper.right._state = bool(event.state)
-                    case 'BTN_MODE':   self.key.mode._state     = bool(event.state)
-                    case 'BTN_SELECT': self.key.select._state   = bool(event.state)
-                    case 'BTN_START':  self.key.start._state    = bool(event.state)
-                    case 'BTN_SOUTH':  self.key.a._state        = bool(event.state)
-                    case 'BTN_EAST':   self.key.b._state        = bool(event.state)
-                    case 'BTN_NORTH':  self.key.x._state        = bool(event.state)
-                    case 'BTN_WEST':   self.key.y._state        = bool(event.state)
-                    case 'BTN_THUMBL': self.thumb.left._state   = bool(event.state)
-                    case 'BTN_THUMBR': self.thumb.right._state  = bool(event.state)
+        while self._is_running:
 
-            elif event.ev_type == EventType.ABSOLUTE:
+            try:
+                events = get_gamepad()
+            except (UnpluggedError, OSError):
+                if pad.pad in self._states:
+                    self._disconnect(pad)
+                sleep(1)
+                continue
 
-                match event.code:
-                    case 'ABS_HAT0X': self.dpad._x             = event.state
-                    case 'ABS_HAT0Y': self.dpad._y             = event.state
-                    case 'ABS_X':     self.stick.left.x        = event.state
-                    case 'ABS_Y':     self.stick.left.y        = event.state
-                    case 'ABS_RX':    self.stick.right.x       = event.state
-                    case 'ABS_RY':    self.stick.right.y       = event.state
-                    case 'ABS_Z':     self.trigger.left.value  = event.state
-                    case 'ABS_RZ':    self.trigger.right.value = event.state
+            for event in events:
+                if event.ev_type == EventType.KEY:
+                    pad.key(event.code, event.state)
+                elif event.ev_type == EventType.ABSOLUTE:
+                    pad.axis(event.code, event.state)
+            self._publish(pad)
 
 
 if __name__ == '__main__':
-    from time import sleep
     gamepad = GamepadListener()
     gamepad.start()
     try:
         while True:
+            state = gamepad.state
             print(
-                gamepad.stick.left,
-                gamepad.stick.right,
-                gamepad.trigger.left,
-                gamepad.trigger.right,
-                gamepad.key.a,
-                bool(gamepad.stick.right)
+                state.left,
+                state.right,
+                state.left_trigger,
+                state.right_trigger,
+                sorted(state.buttons),
+                gamepad.poll_events()
             )
             sleep(0.1)
     except KeyboardInterrupt:
-        gamepad.stop()
\ No newline at end of file
+        gamepad.stop()
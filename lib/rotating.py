@@ -0,0 +1,39 @@
+from os      import makedirs, replace
+from os.path import dirname, exists, getsize
+
+
+class RotatingFile:
+    '''
+    Append-only text file that is renamed to `<path>.1` once it grows past
+    `max_bytes`, keeping up to `backups` older files (`<path>.1` is the newest).
+    '''
+
+    def __init__(self, path: str, max_bytes: int = 8 * 1024 * 1024, backups: int = 3) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        makedirs(dirname(path), exist_ok = True)
+        self._file = open(path, 'a', encoding = 'utf-8')
+        self._size = getsize(path)
+
+    def _rotate(self) -> None:
+        self._file.close()
+        for i in range(self.backups - 1, 0, -1):
+            if exists(f'{self.path}.{i}'):
+                replace(f'{self.path}.{i}', f'{self.path}.{i + 1}')
+        if self.backups:
+            replace(self.path, f'{self.path}.1')
+        self._file = open(self.path, 'w', encoding = 'utf-8')
+        self._size = 0
+
+    def write(self, text: str) -> None:
+        if self._size and self._size + len(text) > self.max_bytes:
+            self._rotate()
+        self._file.write(text)
+        self._size += len(text)
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
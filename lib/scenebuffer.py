@@ -0,0 +1,125 @@
+from pyglet.window import Window
+from pyglet.sprite import Sprite
+from pyglet.image  import Framebuffer, Texture
+from pyglet        import gl
+from pyglet.gl.lib import MissingFunctionException
+
+from ctypes import c_int, c_uint64
+
+
+class SceneBuffer:
+    '''
+    Off-screen target for drawing part of the frame at a lower resolution.
+
+    Everything drawn between `begin()` and `end()` lands in a framebuffer
+    `scale` times the size of the window, which `end()` then stretches over
+    the window. At scale 1 nothing is redirected at all.
+
+    The GPU time of that part is measured with timer queries and handed out
+    by `take_gpu_ms()` a few frames late, so that reading it never stalls.
+    '''
+
+    QUERIES = 3
+
+    def __init__(self, window: Window, scale: float = 1.0) -> None:
+        self.window = window
+        self.scale = scale
+        self._gpu_ms: float | None = None
+
+        self._framebuffer: Framebuffer | None = None
+        self._sprite: Sprite | None = None
+        self._texture: Texture | None = None
+        self._viewport = (0, 0, 0, 0)
+
+        self._queries = (gl.GLuint * self.QUERIES)()
+        self._query = 0
+        self._pending = [False] * self.QUERIES
+        # Some drivers report nonsense for the very first query
+        self._warm = False
+        try:
+            gl.glGenQueries(self.QUERIES, self._queries)
+            self._timed = True
+        except (gl.GLException, MissingFunctionException):
+            self._timed = False
+
+    def _size(self) -> tuple[int, int]:
+        width, height = self.window.get_framebuffer_size()
+        return max(1, round(width * self.scale)), max(1, round(height * self.scale))
+
+    def _allocate(self) -> None:
+        width, height = self._size()
+        if self._framebuffer is not None:
+            if (self._texture.width, self._texture.height) == (width, height):
+                return None
+            self._release()
+
+        self._texture = Texture.create(width, height, min_filter = gl.GL_LINEAR, mag_filter = gl.GL_LINEAR)
+        self._framebuffer = Framebuffer()
+        self._framebuffer.attach_texture(self._texture)
+
+        # The scene is opaque, so it is copied over the window without blending
+        self._sprite = Sprite(self._texture, blend_src = gl.GL_ONE, blend_dest = gl.GL_ZERO)
+        self._sprite.scale_x = self.window.width / width
+        self._sprite.scale_y = self.window.height / height
+
+    def _release(self) -> None:
+        if self._framebuffer is not None:
+            self._sprite.delete()
+            self._framebuffer.delete()
+            self._texture.delete()
+            self._framebuffer = self._sprite = self._texture = None
+
+    def _collect(self) -> None:
+        # The query issued QUERIES - 1 frames ago is read once the GPU is done with it
+        query = self._queries[self._query]
+        if not self._pending[self._query]:
+            return None
+        available = c_int()
+        gl.glGetQueryObjectiv(query, gl.GL_QUERY_RESULT_AVAILABLE, available)
+        if available.value:
+            elapsed = c_uint64()
+            gl.glGetQueryObjectui64v(query, gl.GL_QUERY_RESULT, elapsed)
+            if self._warm:
+                self._gpu_ms = elapsed.value / 1e6
+            self._warm = True
+            self._pending[self._query] = False
+
+    def take_gpu_ms(self) -> float | None:
+        '''
+        Returns the newest GPU time not taken yet, or None.
+        '''
+        gpu_ms, self._gpu_ms = self._gpu_ms, None
+        return gpu_ms
+
+    def begin(self) -> None:
+        if self._timed:
+            self._collect()
+            if not self._pending[self._query]:
+                gl.glBeginQuery(gl.GL_TIME_ELAPSED, self._queries[self._query])
+
+        if self.scale >= 1:
+            self._release()
+            return None
+
+        self._allocate()
+        self._viewport = self.window.viewport
+        self._framebuffer.bind()
+        width, height = self._size()
+        gl.glViewport(0, 0, width, height)
+
+    def end(self) -> None:
+        if self._framebuffer is not None:
+            self._framebuffer.unbind()
+            self.window.viewport = self._viewport
+            self._sprite.draw()
+
+        if self._timed and not self._pending[self._query]:
+            gl.glEndQuery(gl.GL_TIME_ELAPSED)
+            self._pending[self._query] = True
+            self._query = (self._query + 1) % self.QUERIES
+
+    def delete(self) -> None:
+        self._release()
+        if self._timed:
+            gl.glDeleteQueries(self.QUERIES, self._queries)
+            self._timed = False
@@ -0,0 +1,138 @@
+from struct import Struct
+from typing import Any, Callable, BinaryIO
+
+
+# Session log format (little-endian):
+#
+#   header   magic b'BCSR', version u16, spawner seed i64, window width u16, window height u16,
+#            spawner profile name as u8 length + UTF-8
+#   records  kind u8, simulation step u32, interpolation alpha f64, seconds since start f64,
+#            followed by the payload of that kind
+#
+# Inputs are stamped with the number of simulation steps done and the alpha
+# of the frame they were made on, so that a replay can put every bubble
+# exactly where it was when the input happened.
+
+MAGIC   = b'BCSR'
+VERSION = 2
+
+SPAWN, MOUSE_PRESS, KEY_PRESS, GAMEPAD_PRESS = range(4)
+
+_header  = Struct('<4sHqHH')
+_record  = Struct('<BIdd')
+_payload = {
+    SPAWN:         Struct('<iddddf?'),  # x_origin, amplitude, frequency, x_shift, speed, anchor, common
+    MOUSE_PRESS:   Struct('<iiii'),     # x, y, button, modifiers
+    KEY_PRESS:     Struct('<QI'),       # symbol (unmapped keys are scancode << 32), modifiers
+    GAMEPAD_PRESS: Struct('<iiB')       # cursor x, cursor y, button
+}
+
+GAMEPAD_BUTTONS = ('A', 'B', 'X', 'Y', 'LB', 'RB', 'LT', 'RT', 'SELECT', 'START', 'MODE', 'LS', 'RS')
+
+
+class SessionEvent:
+    __slots__ = ('kind', 'step', 'alpha', 'time', 'args')
+
+    def __init__(self, kind: int, step: int, alpha: float, time: float, args: tuple) -> None:
+        self.kind = kind
+        self.step = step
+        self.alpha = alpha
+        self.time = time
+        self.args = args
+
+
+class SessionRecorder:
+    '''
+    Appends the spawns and inputs of a session to a binary log.
+
+    `clock` returns the current `(step, alpha, seconds)` stamp.
+    '''
+
+    def __init__(self, path: str, seed: int, profile: str, width: int, height: int, clock: Callable[[], tuple[int, float, float]]) -> None:
+        self.clock = clock
+        self._file: BinaryIO = open(path, 'wb')
+        name = profile.encode('utf-8')[:255]
+        self._file.write(_header.pack(MAGIC, VERSION, seed, width, height) + bytes((len(name),)) + name)
+
+    def _write(self, kind: int, *args) -> None:
+        if self._file.closed:
+            return None
+        self._file.write(_record.pack(kind, *self.clock()) + _payload[kind].pack(*args))
+
+    def spawn(self, x_origin: int, amplitude: float = 150, frequency: float = 0.025, x_shift: float = 0, speed: float = 40, common: bool = True, anchor: float = 0) -> None:
+        self._write(SPAWN, x_origin, amplitude, frequency, x_shift, speed, anchor, common)
+
+    def tap(self, field: Any) -> 'RecordingField':
+        '''
+        Returns a stand-in for `field` whose `spawn()` is recorded before it is passed on.
+        '''
+        return RecordingField(self, field)
+
+    def mouse_press(self, x: int, y: int, button: int, modifiers: int) -> None:
+        self._write(MOUSE_PRESS, x, y, button, modifiers)
+
+    def key_press(self, symbol: int, modifiers: int) -> None:
+        self._write(KEY_PRESS, symbol, modifiers)
+
+    def gamepad_press(self, x: int, y: int, button: str) -> None:
+        if button in GAMEPAD_BUTTONS:
+            self._write(GAMEPAD_PRESS, x, y, GAMEPAD_BUTTONS.index(button))
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class RecordingField:
+    __slots__ = ('recorder', 'field')
+
+    def __init__(self, recorder: SessionRecorder, field: Any) -> None:
+        self.recorder = recorder
+        self.field = field
+
+    def spawn(self, **params) -> None:
+        self.recorder.spawn(**params)
+        self.field.spawn(**params)
+
+
+class SessionLog:
+    '''
+    A recorded session, read back in order with `due()`.
+    '''
+
+    def __init__(self, path: str) -> None:
+        with open(path, 'rb') as file:
+            data = file.read()
+
+        magic, version, self.seed, self.width, self.height = _header.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not a session log of version {VERSION}')
+        offset = _header.size
+        self.profile = data[offset + 1:offset + 1 + data[offset]].decode('utf-8')
+        offset += 1 + data[offset]
+
+        self.events: list[SessionEvent] = []
+        while offset + _record.size <= len(data):
+            kind, step, alpha, time = _record.unpack_from(data, offset)
+            payload = _payload[kind]
+            if offset + _record.size + payload.size > len(data):
+                break
+            args = payload.unpack_from(data, offset + _record.size)
+            if kind == GAMEPAD_PRESS:
+                args = args[:2] + (GAMEPAD_BUTTONS[args[2]],)
+            self.events.append(SessionEvent(kind, step, alpha, time, args))
+            offset += _record.size + payload.size
+        self._cursor = 0
+
+    @property
+    def finished(self) -> bool:
+        return self._cursor == len(self.events)
+
+    def due(self, step: int) -> list[SessionEvent]:
+        '''
+        Returns the events not handed out yet that happened after at most `step` simulation steps.
+        '''
+        start = end = self._cursor
+        while end < len(self.events) and self.events[end].step <= step:
+            end += 1
+        self._cursor = end
+        return self.events[start:end]
@@ -1,32 +1,295 @@
-from .plato import appdata_path
-from json   import load, dump
-from os     import makedirs
+from .plato      import appdata_path
+from .minilogger import Console
+from .spawner    import PROFILES, check_profile
+from .framepacer import check_rates
+from threading   import Thread, Condition, Lock
+from typing      import Any, Callable
+from json        import load, dumps
+from copy        import deepcopy
+from time        import monotonic
+from os          import makedirs, replace, fsync
 
 APPDATA_PATH = appdata_path('BubblesAndChillout')
+SETTINGS_PATH = f'{APPDATA_PATH}/settings.json'
 
 default_settings = {
-    'config_version': 2,
+    'config_version': 3,
     'locale': 0,
     'shuffle': True,
     'shake_level': 1,
     'gamepad': {
         'sticks_dz': 0,
         'mouse_sensitivity': 10
+    },
+    'render': {
+        'low_power': True,
+        'min_fps': 20,
+        'max_fps': 60,
+        'scale': 1.0
+    },
+    'quality': {
+        'governor': True,
+        'budget_ms': 16.6
+    },
+    'spawner': {
+        # A negative seed picks a new one on every start
+        'seed': -1,
+        'profile': 'default',
+        'profiles': deepcopy(PROFILES)
     }
 }
-try:
-    makedirs(f'{APPDATA_PATH}/')
-    settings = default_settings
-    with open(f'{APPDATA_PATH}/settings.json', 'w') as file:
-        dump(default_settings, file)
-except OSError:
-    with open(f'{APPDATA_PATH}/settings.json', 'r') as file:
-        settings = load(file)
-    if settings.keys() != default_settings.keys() or settings['config_version'] != default_settings['config_version']:
-        settings = default_settings
-        with open(f'{APPDATA_PATH}/settings.json', 'w') as file:
-            dump(default_settings, file)
+
+# Upgrades a config of version N (the key) to version N + 1.
+# Keys missing after the upgrade are taken from default_settings.
+migrations: dict[int, Callable[[dict], dict]] = {}
+
+
+def _merge_profiles(defaults: dict, loaded: dict) -> dict:
+    # Unlike the other sections, the spawner profiles are open: profiles added
+    # by the user are kept, as long as they are valid
+    merged = {}
+    for name in [*defaults, *(name for name in loaded if name not in defaults)]:
+        template = defaults.get(name, defaults['default'])
+        value = loaded.get(name, template)
+        try:
+            if not isinstance(value, dict):
+                raise ValueError('not an object')
+            profile = _merge(template, value)
+            check_profile(profile)
+        except ValueError as exc:
+            Console.log(f'spawner profile {name!r} is invalid ({exc}); {"using the default one" if name in defaults else "dropping it"}', 'SettingsManager', 'W')
+            if name not in defaults:
+                continue
+            profile = deepcopy(defaults[name])
+        merged[name] = profile
+    return merged
+
+
+def _merge_render(defaults: dict, loaded: dict) -> dict:
+    merged = _merge(defaults, loaded)
+    try:
+        check_rates(merged['min_fps'], merged['max_fps'])
+    except ValueError as exc:
+        Console.log(f'render frame rates are invalid ({exc}); using the default ones', 'SettingsManager', 'W')
+        merged['min_fps'] = defaults['min_fps']
+        merged['max_fps'] = defaults['max_fps']
+    return merged
+
+
+# Sections merged by their own rules instead of by the keys of default_settings
+_mergers: dict[str, Callable[[dict, dict], dict]] = {
+    'render': _merge_render,
+    'spawner.profiles': _merge_profiles
+}
+
+
+def _merge(defaults: dict, loaded: dict, prefix: str = '') -> dict:
+    '''
+    Takes the known keys of `loaded` whose values have the right type; the rest comes from `defaults`.
+    '''
+    merged = {}
+    for key, default in defaults.items():
+        value = loaded.get(key)
+        if isinstance(default, dict) and isinstance(value, dict):
+            merger = _mergers.get(f'{prefix}{key}')
+            merged[key] = merger(default, value) if merger else _merge(default, value, f'{prefix}{key}.')
+        elif type(value) is type(default) or (type(value) in (int, float) and type(default) in (int, float)):
+            merged[key] = value
+        else:
+            merged[key] = deepcopy(default)
+    return merged
+
+
+def migrate(loaded: dict) -> dict:
+    version = loaded.get('config_version', 1)
+    while isinstance(version, int) and version < default_settings['config_version']:
+        if version in migrations:
+            Console.log(f'migrating settings from version {version}', 'SettingsManager', 'I')
+            loaded = migrations[version](loaded)
+        version += 1
+    merged = _merge(default_settings, loaded)
+    merged['config_version'] = default_settings['config_version']
+    return merged
+
+
+def write_atomically(path: str, text: str) -> None:
+    with open(f'{path}.tmp', 'w', encoding = 'utf-8') as file:
+        file.write(text)
+        file.flush()
+        fsync(file.fileno())
+    replace(f'{path}.tmp', path)
+
+
+class SettingsSection:
+    '''
+    Typed group of settings with attribute access.
+
+    Subclasses list their settings in `__slots__`; nested groups are named
+    in `sections`. Assigning a different value to a setting reports its
+    dotted key (e.g. `gamepad.mouse_sensitivity`) to `notify`.
+    '''
+
+    __slots__ = ('_notify', '_prefix')
+    sections: dict[str, type['SettingsSection']] = {}
+
+    def __init__(self, values: dict, notify: Callable[[str, Any], None], prefix: str = '') -> None:
+        object.__setattr__(self, '_notify', notify)
+        object.__setattr__(self, '_prefix', prefix)
+        for name in self.fields():
+            value = values[name]
+            if name in self.sections:
+                value = self.sections[name](value, notify, f'{prefix}{name}.')
+            object.__setattr__(self, name, value)
+
+    @classmethod
+    def fields(cls) -> tuple[str, ...]:
+        return tuple(name for name in cls.__slots__ if not name.startswith('_'))
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if getattr(self, name) == value:
+            return None
+        object.__setattr__(self, name, value)
+        self._notify(f'{self._prefix}{name}', value)
+
+    def to_dict(self) -> dict:
+        return {
+            name: value.to_dict() if isinstance(value, SettingsSection) else value
+            for name, value in ((name, getattr(self, name)) for name in self.fields())
+        }
+
+
+class GamepadSettings(SettingsSection):
+    __slots__ = ('sticks_dz', 'mouse_sensitivity')
+
+    sticks_dz: float
+    mouse_sensitivity: float
+
+
+class RenderSettings(SettingsSection):
+    __slots__ = ('low_power', 'min_fps', 'max_fps', 'scale')
+
+    low_power: bool
+    min_fps: int
+    max_fps: int
+    scale: float
+
+
+class QualitySettings(SettingsSection):
+    __slots__ = ('governor', 'budget_ms')
+
+    governor: bool
+    budget_ms: float
+
+
+class SpawnerSettings(SettingsSection):
+    __slots__ = ('seed', 'profile', 'profiles')
+
+    seed: int
+    profile: str
+    profiles: dict[str, dict]
+
+
+class Settings(SettingsSection):
+    '''
+    The application settings.
+
+    Every change marks its key dirty; a background thread writes the whole
+    file atomically once nothing has changed for `delay` seconds, so a burst
+    of toggles costs a single write. Callbacks registered with `subscribe()`
+    are called with the new value right after a change.
+    '''
+
+    __slots__ = ('config_version', 'locale', 'shuffle', 'shake_level', 'gamepad', 'render', 'quality', 'spawner', '_path', '_delay', '_dirty', '_due', '_listeners', '_changed', '_write_lock', '_thread')
+    sections = {'gamepad': GamepadSettings, 'render': RenderSettings, 'quality': QualitySettings, 'spawner': SpawnerSettings}
+
+    config_version: int
+    locale: int
+    shuffle: bool
+    shake_level: int
+    gamepad: GamepadSettings
+    render: RenderSettings
+    quality: QualitySettings
+    spawner: SpawnerSettings
+
+    def __init__(self, path: str, values: dict, delay: float = 1) -> None:
+        for name, value in (
+            ('_path',       path),
+            ('_delay',      delay),
+            ('_dirty',      set()),
+            ('_due',        0.0),
+            ('_listeners',  {}),
+            ('_changed',    Condition()),
+            ('_write_lock', Lock())
+        ):
+            object.__setattr__(self, name, value)
+        super().__init__(values, self._on_change)
+
+        object.__setattr__(self, '_thread', Thread(
+            target = self._writer,
+            args   = (),
+            name   = 'SettingsWriterThread',
+            daemon = True
+        ))
+        self._thread.start()
+
+    def subscribe(self, key: str, callback: Callable[[Any], None]) -> None:
+        self._listeners.setdefault(key, []).append(callback)
+
+    def _on_change(self, key: str, value: Any) -> None:
+        with self._changed:
+            self._dirty.add(key)
+            object.__setattr__(self, '_due', monotonic() + self._delay)
+            self._changed.notify()
+        for callback in self._listeners.get(key, ()):
+            callback(value)
+
+    def _take_snapshot(self) -> str | None:
+        if not self._dirty:
+            return None
+        Console.log(f'saving {", ".join(sorted(self._dirty))}', 'SettingsManager', 'D')
+        self._dirty.clear()
+        return dumps(self.to_dict())
+
+    def _writer(self) -> None:
+        while True:
+            with self._changed:
+                while not self._dirty:
+                    self._changed.wait()
+                while monotonic() < self._due:
+                    self._changed.wait(self._due - monotonic())
+            self.save()
+
+    def save(self) -> None:
+        '''
+        Writes the pending changes right away.
+        '''
+        with self._write_lock:
+            with self._changed:
+                snapshot = self._take_snapshot()
+            if snapshot is not None:
+                write_atomically(self._path, snapshot)
+
+
+def load_settings() -> Settings:
+    makedirs(f'{APPDATA_PATH}/', exist_ok = True)
+    try:
+        with open(SETTINGS_PATH, 'r', encoding = 'utf-8') as file:
+            loaded = load(file)
+    except FileNotFoundError:
+        loaded = {}
+    except ValueError:
+        Console.log('settings.json is damaged; using the defaults', 'SettingsManager', 'W')
+        replace(SETTINGS_PATH, f'{SETTINGS_PATH}.bak')
+        loaded = {}
+
+    data = migrate(loaded if isinstance(loaded, dict) else {})
+    if data != loaded:
+        write_atomically(SETTINGS_PATH, dumps(data))
+    return Settings(SETTINGS_PATH, data)
+
+
+settings = load_settings()
+
 
 def save_settings():
-    with open(f'{APPDATA_PATH}/settings.json', 'w') as file:
-        dump(settings, file)
\ No newline at end of file
+    settings.save()
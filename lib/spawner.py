@@ -0,0 +1,119 @@
+from random import Random
+from typing import Any
+
+
+# Bubbles per second, live bubbles cap, ranges of the bubble parameters, and the odds of a companion cube
+PROFILES = {
+    'calm': {
+        'rate': 0.25,
+        'max_bubbles': 15,
+        'speed': [25, 40],
+        'frequency': [0.015, 0.02],
+        'x_shift': [0, 0],
+        'cube_odds': 0.001
+    },
+    'default': {
+        'rate': 0.5,
+        'max_bubbles': 100,
+        'speed': [30, 60],
+        'frequency': [0.015, 0.025],
+        'x_shift': [0, 0],
+        'cube_odds': 0.001
+    },
+    'busy': {
+        'rate': 4,
+        'max_bubbles': 300,
+        'speed': [30, 80],
+        'frequency': [0.015, 0.03],
+        'x_shift': [-0.2, 0.2],
+        'cube_odds': 0.01
+    },
+    'stress': {
+        'rate': 500,
+        'max_bubbles': 5000,
+        'speed': [30, 120],
+        'frequency': [0.01, 0.03],
+        'x_shift': [-0.2, 0.2],
+        'cube_odds': 0.01
+    }
+}
+
+
+def check_profile(profile: dict) -> None:
+    '''
+    Raises ValueError if `profile` can't drive a `Spawner`.
+    '''
+    def number(value: Any) -> bool:
+        return type(value) in (int, float)
+
+    if not number(profile['rate']) or profile['rate'] <= 0:
+        raise ValueError(f'rate must be a positive number, not {profile["rate"]!r}')
+    if type(profile['max_bubbles']) is not int or profile['max_bubbles'] < 0:
+        raise ValueError(f'max_bubbles must be a non-negative integer, not {profile["max_bubbles"]!r}')
+    for key in ('speed', 'frequency', 'x_shift'):
+        if len(profile[key]) != 2 or not all(number(bound) for bound in profile[key]):
+            raise ValueError(f'{key} must be a [low, high] pair of numbers, not {profile[key]!r}')
+    if not number(profile['cube_odds']) or not 0 <= profile['cube_odds'] <= 1:
+        raise ValueError(f'cube_odds must be a number from 0 to 1, not {profile["cube_odds"]!r}')
+
+
+class Spawner:
+    '''
+    Decides when and with which parameters bubbles appear.
+
+    Spawns arrive as a Poisson process with the profile's `rate`, and all
+    randomness comes from one `Random(seed)`, so the same seed, profile and
+    sequence of `advance()` calls give the same bubbles. No bubbles are
+    spawned while `max_bubbles` are alive.
+
+    `rate_scale` and `max_bubbles` let e.g. a quality governor thin the
+    profile out; a `max_bubbles` of None leaves the profile's cap alone.
+    '''
+
+    def __init__(self, profile: dict, width: int, size: int, cube_anchor: float, seed: int) -> None:
+        check_profile(profile)
+        self.profile = profile
+        self.width = width
+        self.size = size
+        self.cube_anchor = cube_anchor
+        self.seed = seed
+        self.rng = Random(seed)
+        self.rate_scale = 1.0
+        self.max_bubbles: int | None = None
+        self._next_in = self._interval()
+
+    def _interval(self) -> float:
+        return self.rng.expovariate(self.profile['rate'] * self.rate_scale)
+
+    def delay(self) -> float:
+        '''
+        Seconds until the next spawn is due.
+        '''
+        return self._next_in
+
+    def advance(self, dt: float, live: int, field: Any) -> int:
+        '''
+        Lets `dt` seconds pass and spawns the due bubbles into `field`, of which `live` are alive.
+
+        Returns the number of spawned bubbles.
+        '''
+        profile = self.profile
+        rng = self.rng
+        spawned = 0
+        cap = profile['max_bubbles'] if self.max_bubbles is None else min(self.max_bubbles, profile['max_bubbles'])
+        self._next_in -= dt
+        while self._next_in <= 0:
+            self._next_in += self._interval()
+            if live + spawned >= cap:
+                continue
+            common = rng.random() >= profile['cube_odds']
+            field.spawn(
+                x_origin  = rng.randint(0, self.width - self.size),
+                speed     = rng.uniform(*profile['speed']),
+                frequency = rng.uniform(*profile['frequency']),
+                x_shift   = rng.uniform(*profile['x_shift']),
+                common    = common,
+                anchor    = 0 if common else self.cube_anchor
+            )
+            spawned += 1
+        return spawned
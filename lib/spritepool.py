@@ -0,0 +1,38 @@
+from pyglet.graphics import Batch, Group
+from pyglet.sprite   import Sprite
+from pyglet.image    import AbstractImage
+
+
+class SpritePool:
+    '''
+    Recycles sprites of a single batch.
+
+    Released sprites are hidden instead of deleted, so their vertex lists stay
+    allocated and can be handed out again without touching the batch.
+    '''
+
+    def __init__(self, batch: Batch, group: Group | None = None) -> None:
+        self.batch = batch
+        self.group = group
+        self._free: list[Sprite] = []
+        self.in_use = 0
+
+    def acquire(self, img: AbstractImage, x: float = 0, y: float = 0) -> Sprite:
+        self.in_use += 1
+        if not self._free:
+            return Sprite(img, x, y, batch = self.batch, group = self.group)
+        sprite = self._free.pop()
+        if sprite.image is not img:
+            sprite.image = img
+        sprite.rotation = 0
+        sprite.position = (x, y, 0)
+        sprite.visible = True
+        return sprite
+
+    def release(self, sprite: Sprite) -> None:
+        self.in_use -= 1
+        sprite.visible = False
+        self._free.append(sprite)
+
+    def __len__(self) -> int:
+        return self.in_use
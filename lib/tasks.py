@@ -0,0 +1,70 @@
+from pyglet.clock import Clock, get_default
+from typing       import Generator
+
+
+class Task:
+    '''
+    Generator stepped by the clock.
+
+    Every number the generator yields is the delay in seconds before it is
+    resumed, and the `yield` evaluates to the time that actually passed;
+    returning ends the task. Cancelling closes the generator, so `finally:`
+    blocks in it run as usual.
+    '''
+
+    __slots__ = ('name', 'generator', 'scheduler')
+
+    def __init__(self, name: str, generator: Generator[float, float, None], scheduler: 'TaskScheduler') -> None:
+        self.name = name
+        self.generator = generator
+        self.scheduler = scheduler
+
+    def __call__(self, dt: float | None) -> None:
+        try:
+            delay = self.generator.send(dt)
+        except StopIteration:
+            self.scheduler._finished(self)
+            return None
+        self.scheduler.clock.schedule_once(self, delay)
+
+    def cancel(self) -> None:
+        self.scheduler.clock.unschedule(self)
+        self.generator.close()
+
+
+class TaskScheduler:
+    '''
+    Named tasks running on the pyglet clock instead of helper threads.
+
+    Tasks never wait in a thread; the clock calls them when their delay is
+    over, and `cancel_all()` stops every one of them at once.
+    '''
+
+    def __init__(self, clock: Clock | None = None) -> None:
+        self.clock = clock or get_default()
+        self._tasks: dict[str, Task] = {}
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._tasks
+
+    def start(self, name: str, generator: Generator[float, float, None]) -> Task:
+        '''
+        Runs `generator` up to its first `yield` right away. A task running under the same name is cancelled.
+        '''
+        self.cancel(name)
+        task = self._tasks[name] = Task(name, generator, self)
+        task(None)
+        return task
+
+    def _finished(self, task: Task) -> None:
+        if self._tasks.get(task.name) is task:
+            del self._tasks[task.name]
+
+    def cancel(self, name: str) -> None:
+        task = self._tasks.pop(name, None)
+        if task is not None:
+            task.cancel()
+
+    def cancel_all(self) -> None:
+        for name in list(self._tasks):
+            self.cancel(name)
@@ -0,0 +1,53 @@
+from collections import deque
+from threading   import Thread, Event
+from json        import dumps
+
+from .rotating import RotatingFile
+
+
+class FrameTelemetry:
+    '''
+    Per-frame metrics, written to a rotating JSONL file by a background thread.
+
+    `record()` only appends a tuple to a bounded buffer, so it is safe to call
+    from the render thread; if the writer falls behind, the oldest records are
+    dropped instead of the buffer growing.
+    '''
+
+    fields = ('time', 'frame_ms', 'bubbles', 'pops', 'effects', 'prefetch_misses')
+
+    def __init__(self, path: str, capacity: int = 3600, flush_interval: float = 5, max_bytes: int = 8 * 1024 * 1024, backups: int = 3) -> None:
+        self._buffer: deque[tuple] = deque(maxlen = capacity)
+        self._file = RotatingFile(path, max_bytes, backups)
+        self._flush_interval = flush_interval
+        self._stopped = Event()
+        self._thread = Thread(
+            target = self._writer,
+            args   = (),
+            name   = 'TelemetryWriterThread',
+            daemon = True
+        )
+        self._thread.start()
+
+    def record(self, *values) -> None:
+        self._buffer.append(values)
+
+    def _flush(self) -> None:
+        lines = []
+        while self._buffer:
+            lines.append(dumps(dict(zip(self.fields, self._buffer.popleft()))))
+        if lines:
+            self._file.write('\n'.join(lines) + '\n')
+            self._file.flush()
+
+    def _writer(self) -> None:
+        while not self._stopped.wait(self._flush_interval):
+            self._flush()
+
+    def close(self) -> None:
+        if self._stopped.is_set():
+            return None
+        self._stopped.set()
+        self._thread.join()
+        self._flush()
+        self._file.close()
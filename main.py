@@ -1,36 +1,164 @@
 from lib.plato import show_popup
 from traceback import format_exc
+from argparse  import ArgumentParser
+
+
+parser = ArgumentParser(description = 'Bubbles and Chillout')
+parser.add_argument('--record', metavar = 'PATH', help = 'record the spawns and inputs of this session into a binary log')
+parser.add_argument('--replay', metavar = 'PATH', help = 'replay a session recorded with --record')
+parser.add_argument('--replay-speed', choices = ('recorded', 'max'), default = 'recorded', help = 'replay in real time or as fast as the simulation can go')
+args = parser.parse_args()
 
 try:
 
-	from pyglet.graphics import Batch
-	from pyglet.resource import media
+	from pyglet.graphics import Batch, Group
+	from pyglet.math     import Mat4, Vec3
 	from pyglet.display  import get_display
 	from pyglet.window   import key, Window
 	from pyglet.sprite   import Sprite
-	from pyglet.image    import load as pgl_load_image, AbstractImage
-	from pyglet.clock    import schedule_interval
+	from pyglet.image    import AbstractImage
+	from pyglet.clock    import schedule_interval, schedule_once, unschedule
 	from pyglet.event    import EVENT_HANDLED
-	from pyglet.media    import Player
+	from pyglet.media    import Player, load as load_media
 	from pyglet.text     import Label
 	from pyglet.app      import event_loop, run
 
-	from lib.settingsmgr import settings, save_settings
+	from lib.settingsmgr import settings, save_settings, APPDATA_PATH
 	from lib.pligamepad  import GamepadListener
 	from lib.minilogger  import Console
+	from lib.spritepool  import SpritePool
+	from lib.bubblefield import BubbleField
+	from lib.fixedstep   import FixedStep
+	from lib.effects     import EffectScheduler
+	from lib.atlas       import ImageAtlas
+	from lib.assetloader import AssetLoader
+	from lib.musiclib    import MusicLibrary
+	from lib.playlist    import Playlist
+	from lib.bufferedsource import BufferedSource
+	from lib.frameprofiler import FrameProfiler
+	from lib.telemetry   import FrameTelemetry
+	from lib.framepacer  import FramePacer
+	from lib.scenebuffer import SceneBuffer
+	from lib.governor    import QualityGovernor
+	from lib.tasks       import TaskScheduler
+	from lib.spawner     import Spawner
+	from lib.session     import SessionRecorder, SessionLog, SPAWN, MOUSE_PRESS, KEY_PRESS
 
 	from webbrowser import open as open_url
-	from threading  import Thread
-	from random     import random, randint, choice
-	from time       import time, sleep
+	from random     import randrange
+	from time       import time, sleep, perf_counter
 	from json       import load
-	from math       import sin
-	from os         import listdir
+	from math       import ceil
+
+
+	Console.set_file_sink(f'{APPDATA_PATH}/logs/console.log')
+
+
+	def read_json(path: str):
+		with open(path, 'r', encoding = 'utf-8') as file:
+			return load(file)
+
+
+	def probe_track(path: str) -> dict:
+		'''
+		Reads the duration and the tags of a music file.
+		'''
+		source = load_media(path)
+		tags = {}
+		if source.info is not None:
+			for field in ('title', 'author', 'album', 'genre', 'year', 'track'):
+				if getattr(source.info, field):
+					tags[field] = getattr(source.info, field)
+		duration = source.duration
+		source.delete()
+		return {'duration': duration, 'tags': tags}
+
+
+	def index_music() -> MusicLibrary:
+		library = MusicLibrary('resources/music', f'{APPDATA_PATH}/music_index.json', read_json('resources/data/music_meta.json'))
+		library.refresh(probe_track)
+		return library
+
+
+	##############
+	##  ASSETS  ##
+	##############
+
+
+	# Everything is decoded on the loader's pool, starting before the window exists
+	loader = AssetLoader()
+
+	loader.submit('localization', read_json, 'resources/data/localization.json')
+	loader.submit('music_library', index_music)
+
+	images = ImageAtlas({
+		'bubble':                  'resources/sprites/bubble.png',
+		'weighted_companion_cube': 'resources/sprites/weighted_companion_cube.png',
+		'cursor':                  'resources/ui/cursor.png',
+		'github':                  'resources/ui/github.png',
+		'settings':                'resources/ui/settings.png',
+		'shuffle':                 'resources/ui/shuffle.png',
+		'play_pause':              'resources/ui/play_pause.png',
+		'show':                    'resources/ui/show.png',
+		'hide':                    'resources/ui/hide.png',
+		'minimize':                'resources/ui/minimize.png',
+		'cross':                   'resources/ui/cross.png',
+		'disabled':                'resources/ui/disabled.png',
+		'enabled':                 'resources/ui/enabled.png',
+		'globe':                   'resources/ui/globe.png',
+		'pulse':                   'resources/ui/pulse.png',
+		'level_off':               'resources/ui/level_off.png',
+		'level_low':               'resources/ui/level_low.png',
+		'level_medium':            'resources/ui/level_medium.png',
+		'level_high':              'resources/ui/level_high.png'
+	}, f'{APPDATA_PATH}/cache/atlas', 1024, 512)
+
+	# Images the first frame can't do without; the rest is added once decoded, its widgets wait until the settings are opened
+	first_frame_images = [
+		'bubble', 'weighted_companion_cube', 'cursor',
+		'github', 'settings', 'shuffle', 'play_pause', 'hide', 'minimize', 'cross', 'disabled', 'enabled'
+	]
 
+	if images.cached:
+		loader.submit('image:atlas', images.decode_cached)
+	else:
+		for name in images.sources:
+			loader.submit(f'image:{name}', images.decode, name)
 
-	def load_image(path: str) -> AbstractImage:
-		Console.log(f'loading image asset: {path}', 'Loader')
-		return pgl_load_image(path)
+
+	def upload_images(names: list[str]) -> None:
+		'''
+		Puts the decoded images into the atlas texture.
+
+		*Must be called from the main thread.*
+		'''
+		if images.cached:
+			if images.regions:
+				return None
+			try:
+				images.add_cached(loader.get('image:atlas'))
+				return None
+			except Exception as exc:
+				Console.log(f'could not load the cached atlas ({exc}); decoding every image instead', 'Atlas', 'W')
+				images.drop_cached()
+				for name in images.sources:
+					loader.submit(f'image:{name}', images.decode, name)
+		for name in names:
+			if name not in images.regions:
+				images.add(name, loader.get(f'image:{name}'))
+		images.bake()
+
+
+	def upload_deferred_images():
+		'''
+		Adds the rest of the images once they are decoded, so that the atlas gets cached
+		even if the settings are never opened.
+
+		*A task.*
+		'''
+		while not all(loader.done(f'image:{name}') for name in images.sources):
+			yield 0.25
+		upload_images(list(images.sources))
 
 
 	# Initializing the window
@@ -56,35 +184,24 @@ try:
 	window.set_mouse_visible(False)
 
 
-	##############
-	##  ASSETS  ##
-	##############
+	# Loading localization strings
+	locales = loader.get('localization')
 
+	upload_images(first_frame_images)
 
-	# Loading localization strings
-	with open('resources/data/localization.json', 'r', encoding = 'utf-8') as file: locales = load(file)
-
-	# Loading images
-	bubble_img                  = load_image('resources/sprites/bubble.png')
-	weighted_companion_cube_img = load_image('resources/sprites/weighted_companion_cube.png')
-
-	cursor_img     = load_image('resources/ui/cursor.png')
-	github_img     = load_image('resources/ui/github.png')
-	settings_img   = load_image('resources/ui/settings.png')
-	shuffle_img    = load_image('resources/ui/shuffle.png')
-	play_pause_img = load_image('resources/ui/play_pause.png')
-	show_img       = load_image('resources/ui/show.png')
-	hide_img       = load_image('resources/ui/hide.png')
-	minimize_img   = load_image('resources/ui/minimize.png')
-	cross_img      = load_image('resources/ui/cross.png')
-	disabled_img   = load_image('resources/ui/disabled.png')
-	enabled_img    = load_image('resources/ui/enabled.png')
-	globe_img      = load_image('resources/ui/globe.png')
-	pulse_img      = load_image('resources/ui/pulse.png')
-	level0_img     = load_image('resources/ui/level_off.png')
-	level1_img     = load_image('resources/ui/level_low.png')
-	level2_img     = load_image('resources/ui/level_medium.png')
-	level3_img     = load_image('resources/ui/level_high.png')
+	bubble_img                  = images.regions['bubble']
+	weighted_companion_cube_img = images.regions['weighted_companion_cube']
+
+	cursor_img     = images.regions['cursor']
+	github_img     = images.regions['github']
+	settings_img   = images.regions['settings']
+	shuffle_img    = images.regions['shuffle']
+	play_pause_img = images.regions['play_pause']
+	hide_img       = images.regions['hide']
+	minimize_img   = images.regions['minimize']
+	cross_img      = images.regions['cross']
+	disabled_img   = images.regions['disabled']
+	enabled_img    = images.regions['enabled']
 
 	# Settings up anchors
 	weighted_companion_cube_img.anchor_x = weighted_companion_cube_img.width // 2
@@ -97,18 +214,17 @@ try:
 	settings_batch      = Batch()
 	ui_batch            = Batch()
 	gamepad_ctrls_batch = Batch()
+	bubbles_batch       = Batch()
 
-	# Loading music
-	with open('resources/data/music_meta.json', 'r') as file: music_meta = load(file)
-	music = []
-	for fname in listdir('resources/music/'):
-		if fname not in music_meta:
-			Console.log(f'"resources/music/{fname}" has no accompanying entry in music_meta; skipping', 'ResourceLoader', 'W')
-			continue
-		music.append({
-			'media': media(f'resources/music/{fname}'),
-			'name': music_meta[fname]['name']
-		})
+	# Collecting music
+	music = loader.get('music_library').tracks
+
+	# Seconds of every prefetched track decoded ahead; the rest is streamed
+	PREFETCH_SECONDS = 5
+
+	# Without gamepad input for this long, the gamepad is polled at the lower rate
+	GAMEPAD_IDLE_AFTER = 1
+	GAMEPAD_IDLE_INTERVAL = 1/10
 
 
 	###############
@@ -118,8 +234,9 @@ try:
 
 	class Hotkeys:
 		class Keyboard:
-			TOGGLE_UI  = 'F1'
-			SKIP_TRACK = 'Ctrl+N'
+			TOGGLE_UI       = 'F1'
+			TOGGLE_PROFILER = 'F3'
+			SKIP_TRACK      = 'Ctrl+N'
 		class Gamepad:
 			TOGGLE_UI  = 'X'
 			SKIP_TRACK = 'RB'
@@ -131,104 +248,46 @@ try:
 			self.y = y
 
 
-	class Effector:
-		'''
-		Generates screen effects.
-		'''
-
-		render_offset = IntPoint(0, 0)
-
-		@classmethod
-		def shake_fx(cls, x_offset: int, y_offset: int, end_time: float):
-			if not event_loop.is_running:
-				Console.log('waiting until event_loop runs', 'Effector.shake', 'I')
-				while not event_loop.is_running:
-					sleep(0.2)
-				Console.log('met event_loop', 'Effector.shake', 'I')
-			Console.log('started', 'Effector.shake', 'D')
-			while time() < end_time:
-				xs = list([i for i in range(-x_offset, x_offset + 1)])
-				ys = list([i for i in range(-y_offset, y_offset + 1)])
-				xs.remove(cls.render_offset.x)
-				ys.remove(cls.render_offset.y)
-				if not (xs or ys):
-					Console.log('effect cannot be played: all of offsets == 0', 'Effector.shake', 'I')
-					return None
-				if xs:
-					cls.render_offset.x = choice(xs)
-				if ys:
-					cls.render_offset.y = choice(ys)
-				if not event_loop.is_running:
-					Console.log('event_loop is inactive; ending', 'Effector.shake', 'I')
-					return None
-				sleep(0.01)
-			Console.log('ended', 'Effector.shake', 'D')
-			cls.render_offset.x = 0
-			cls.render_offset.y = 0
-
-		@classmethod
-		def shake_widget_fx(cls, x_offset: int, y_offset: int, end_time: float):
-			if not event_loop.is_running:
-				Console.log('waiting until event_loop runs', 'Effector.shake_widget', 'I')
-				while not event_loop.is_running:
-					sleep(0.2)
-				Console.log('met event_loop', 'Effector.shake_widget', 'I')
-			Console.log('started', 'Effector.shake_widget', 'D')
-			sx = shake_level_widget.sprites[0].x
-			sy = shake_level_widget.sprites[0].y
-			while time() < end_time:
-				xs = list([i + sx for i in range(-x_offset, x_offset + 1)])
-				ys = list([i + sy for i in range(-y_offset, y_offset + 1)])
-				try:
-					xs.remove(shake_level_widget.sprites[0].x)
-					ys.remove(shake_level_widget.sprites[0].y)
-				except: ...
-				if not (xs or ys):
-					Console.log('effect cannot be played: all of offsets == 0', 'Effector.shake_widget', 'I')
-					return None
-				if xs:
-					for sprite in shake_level_widget.sprites:
-						sprite.x = choice(xs)
-				if ys:
-					for sprite in shake_level_widget.sprites:
-						sprite.y = choice(ys)
-				if not event_loop.is_running:
-					Console.log('event_loop is inactive; ending', 'Effector.shake_widget', 'I')
-					return None
-				sleep(0.01)
-			Console.log('ended', 'Effector.shake_widget', 'D')
-			for sprite in shake_level_widget.sprites:
-				sprite.x = sx
-				sprite.y = sy
-
-		@classmethod
-		def shake(cls, x_offset: int = 3, y_offset: int = 3, fx_time: float = 1):
-			thr = Thread(
-				target = cls.shake_fx,
-				args   = (x_offset, y_offset, time() + fx_time),
-				name   = 'ShakeFXThread'
-			)
-			thr.start()
-
-		@classmethod
-		def shake_widget(cls, x_offset: int = 3, y_offset: int = 3, fx_time: float = 1):
-			thr = Thread(
-				target = cls.shake_widget_fx,
-				args   = (x_offset, y_offset, time() + fx_time),
-				name   = 'WidgetShakeFXThread'
-			)
-			thr.start()
+	class ShakeGroup(Group):
+		'''
+		Translates everything drawn within it by the current offset of a shake channel.
+		'''
+
+		def __init__(self, channel: str, order: int = 0, parent: Group | None = None) -> None:
+			super().__init__(order, parent)
+			self.channel = channel
+			self._view = None
+
+		def set_state(self) -> None:
+			x, y = effects.offset(self.channel)
+			self._view = window.view
+			if x or y:
+				window.view = self._view @ Mat4.from_translation(Vec3(x, y, 0))
+
+		def unset_state(self) -> None:
+			if window.view is not self._view:
+				window.view = self._view
+
+		# Each channel must stay a separate state in a batch
+		def __eq__(self, other: Group) -> bool:
+			return self is other
+
+		def __hash__(self) -> int:
+			return id(self)
 
 
 	class LevelWidget:
 		def __init__(self, x: int, y: int, level_sprites: list):
+			self.group = ShakeGroup('shake_level_widget')
 			self.sprites = []
 			for img in level_sprites:
-				self.sprites.append(Sprite(img, x, y))
-			self.level = settings['shake_level']
+				self.sprites.append(Sprite(img, x, y, batch = settings_batch, group = self.group))
+			self.set_level(settings.shake_level)
 
-		def draw(self):
-			self.sprites[self.level].draw()
+		def set_level(self, level: int):
+			self.level = level
+			for i, sprite in enumerate(self.sprites):
+				sprite.visible = i == level
 
 
 	class Button:
@@ -288,51 +347,6 @@ try:
 			return False
 		
 
-	class Bubble:
-		raw_y = 0
-		size = bubble_img.width
-		tried_to_update = False
-		common = True
-		popped = False
-		sprite = Sprite(bubble_img)
-
-		def __init__(self, x_origin: int, amplitude: float = 150, frequency: float = 0.025, x_shift: int = 0, speed: float = 40, function = sin) -> None:
-			self.start_time = time()
-			self.x_origin = x_origin
-			self.amplitude = amplitude
-			self.frequency = frequency
-			self.x_shift = x_shift
-			self.speed = speed
-			self.func = function
-
-		@property
-		def y(self) -> int:
-			return int(self.raw_y)
-
-		@property
-		def x(self) -> int:
-			return int(self.func(self.y * self.frequency) * self.amplitude) + (self.x_shift * self.y) + self.x_origin
-
-		def update_y(self) -> None:
-			if not self.tried_to_update:
-				if random() <= 0.001:
-					self.sprite = Sprite(weighted_companion_cube_img)
-					self.common = False
-				self.tried_to_update = True
-			if not self.common:
-				self.sprite.rotation += 0.1
-			self.raw_y = (time() - self.start_time) * self.speed - bubble_img.width
-
-		def pop(self):
-			self.popped = True
-			Effector.shake(2 * settings['shake_level'], 2 * settings['shake_level'], 0.1)
-
-		def draw(self):
-			self.sprite.x = self.x + Effector.render_offset.x
-			self.sprite.y = self.y + Effector.render_offset.y
-			self.sprite.draw()
-
-		
 	###############
 	##  GLOBALS  ##
 	###############
@@ -340,17 +354,69 @@ try:
 
 	hotkey_provider = Hotkeys.Keyboard
 	cursor_pos = IntPoint(0, 0)
-	selected_track = 0
 	media_player = Player()
 	locales_list = list(locales.keys())
+	locale = locales[locales_list[settings.locale]]
+	mouse_sensitivity = settings.gamepad.mouse_sensitivity
 	show_song_info_until = time()
 	settings_shown = False
 	restore_ui_hint_shown = False
 	restore_ui_hint_already_shown = False
 	ui_shown = True
-	bubbles: list['Bubble'] = []
-	a_old = b_old = x_old = rb_old = False
-	gamepad = GamepadListener()
+	bubbles = BubbleField(bubble_img.width)
+	effects = EffectScheduler()
+	profiler = FrameProfiler()
+	tasks = TaskScheduler()
+	pacer = FramePacer(settings.render.max_fps, settings.render.min_fps)
+	pacer.enabled = settings.render.low_power
+	frame_rate = 0
+
+	# Bubbles are drawn at settings.render.scale of the window resolution, the UI always natively
+	scene = SceneBuffer(window, settings.render.scale)
+	governor = QualityGovernor(settings.quality.budget_ms)
+	tick_ms = 0.0
+	telemetry = FrameTelemetry(f'{APPDATA_PATH}/telemetry/frames.jsonl')
+	frame_pops = 0
+	reported_misses = 0
+
+	# Every live bubble borrows a sprite of bubbles_batch from this pool
+	bubble_sprites = SpritePool(bubbles_batch, ShakeGroup('screen'))
+
+	# Spawning is reproducible from the logged seed and profile
+	if settings.spawner.profile not in settings.spawner.profiles:
+		Console.log(f'unknown spawner profile {settings.spawner.profile!r}; using the default one', 'Spawner', 'W')
+		settings.spawner.profile = 'default'
+	bubble_spawner = Spawner(
+		profile     = settings.spawner.profiles[settings.spawner.profile],
+		width       = window.width,
+		size        = bubble_img.width,
+		cube_anchor = weighted_companion_cube_img.width // 2,
+		seed        = settings.spawner.seed if settings.spawner.seed >= 0 else randrange(2 ** 31)
+	)
+	Console.log(f'spawning with the {settings.spawner.profile!r} profile and seed {bubble_spawner.seed}', 'Spawner', 'I')
+
+	# Session recording and replay (see lib/session.py)
+	last_alpha = 0.0
+	session_start = perf_counter()
+	recorder = replay = None
+	spawn_target = bubbles
+	if args.replay:
+		replay = SessionLog(args.replay)
+		Console.log(f'replaying {args.replay} ({len(replay.events)} events, {replay.profile!r} profile, seed {replay.seed}) at {args.replay_speed} speed', 'Session', 'I')
+		if (replay.width, replay.height) != (window.width, window.height):
+			Console.log(f'the session was recorded at {replay.width}x{replay.height}; the replay will differ', 'Session', 'W')
+	elif args.record:
+		recorder = SessionRecorder(
+			args.record, bubble_spawner.seed, settings.spawner.profile, window.width, window.height,
+			lambda: (simulation.steps, last_alpha, perf_counter() - session_start)
+		)
+		spawn_target = recorder.tap(bubbles)
+		Console.log(f'recording the session into {args.record}', 'Session', 'I')
+
+	if replay is not None and args.replay_speed == 'max':
+		pacer.enabled = False
+		pacer.max_fps = 1000
+	gamepad = GamepadListener(settings.gamepad.sticks_dz)
 
 
 	#################
@@ -358,38 +424,101 @@ try:
 	#################
 
 
-	def media_player_controller():
+	def on_locale_changed(value: int):
+		global locale
+		locale = locales[locales_list[value]]
+
+	settings.subscribe('locale', on_locale_changed)
+
+
+	def on_mouse_sensitivity_changed(value: float):
+		global mouse_sensitivity
+		mouse_sensitivity = value
+
+	settings.subscribe('gamepad.mouse_sensitivity', on_mouse_sensitivity_changed)
+
+
+	def on_sticks_dz_changed(value: float):
+		gamepad.deadzone = value
+
+	settings.subscribe('gamepad.sticks_dz', on_sticks_dz_changed)
+
+
+	def on_spawner_profile_changed(value: str):
+		if value in settings.spawner.profiles:
+			bubble_spawner.profile = settings.spawner.profiles[value]
+			Console.log(f'switched to the {value!r} spawner profile', 'Spawner', 'I')
+
+	settings.subscribe('spawner.profile', on_spawner_profile_changed)
+
+
+	def on_render_changed(*args):
+		pacer.enabled = settings.render.low_power
+		pacer.min_fps = settings.render.min_fps
+		pacer.max_fps = settings.render.max_fps
+		fit_simulation_steps()
+		pace_frames()
+
+	for name in ('low_power', 'min_fps', 'max_fps'):
+		settings.subscribe(f'render.{name}', on_render_changed)
+
+
+	def apply_quality_tier(*args):
 		'''
-		Looped playlist generator.
+		Applies the caps of the governor's current tier.
 		'''
-		global selected_track
+		tier = governor.tier
+		scene.scale = min(settings.render.scale, tier['render_scale'])
+		bubble_spawner.max_bubbles = tier['max_bubbles']
+		bubble_spawner.rate_scale = tier['spawn_rate']
 
-		while True:
-			if settings['shuffle']:
-				next_track = randint(0, len(music) - 1)
-				while next_track == selected_track:
-					next_track = randint(0, len(music) - 1)
-				selected_track = next_track
-			else:
-				selected_track += 1
-				if selected_track == len(music):
-					selected_track = 0
-			yield music[selected_track]['media']
+	settings.subscribe('render.scale', apply_quality_tier)
+	apply_quality_tier()
+
+
+	def on_governor_changed(value: bool):
+		if not value:
+			governor.reset()
+			apply_quality_tier()
+
+	settings.subscribe('quality.governor', on_governor_changed)
+
+
+	def on_budget_changed(value: float):
+		governor.budget_ms = value
+
+	settings.subscribe('quality.budget_ms', on_budget_changed)
+
+
+	def open_track(track: dict):
+		'''
+		Opens a track for the playlist; runs on the prefetch worker.
+		'''
+		source = load_media(track['path'])
+		if source.audio_format is None:
+			return source
+		return BufferedSource(source, PREFETCH_SECONDS * source.audio_format.bytes_per_second)
+
+
+	def stream_track(track: dict):
+		'''
+		Opens a track the prefetch didn't get to in time; runs on the main thread.
+		'''
+		return load_media(track['path'])
 
-	media_player.queue(media_player_controller())
+	playlist = Playlist(music, open_track, stream_track, lambda: settings.shuffle)
+	settings.subscribe('shuffle', lambda shuffle: playlist.invalidate())
 
 
 	def change_language(just_refresh: bool = False):
 		'''
 		Changes the GUI locale.
 		'''
-		settings['locale'] += 1 - just_refresh
-		if settings['locale'] == len(locales_list):
-			settings['locale'] = 0
+		settings.locale = (settings.locale + 1 - just_refresh) % len(locales_list)
 
-		song_hint.text = locales[locales_list[settings["locale"]]]['to_skip'].format(hotkey_provider.SKIP_TRACK)
-		locale_label.text = f'{locales[locales_list[settings["locale"]]]["self_name"]} ({locales[locales_list[settings["locale"]]]["en_name"]})'
-		restore_ui_hint.text = locales[locales_list[settings['locale']]]['restore_ui_hint'].format('+'.join([hotkey_provider.TOGGLE_UI]))
+		song_hint.text = locale['to_skip'].format(hotkey_provider.SKIP_TRACK)
+		locale_label.text = f'{locale["self_name"]} ({locale["en_name"]})'
+		restore_ui_hint.text = locale['restore_ui_hint'].format('+'.join([hotkey_provider.TOGGLE_UI]))
 
 	
 	def open_github():
@@ -399,12 +528,33 @@ try:
 		open_url('https://github.com/R1senDev/bubbles_and_chillout')
 
 	
+	def build_settings_widgets():
+		'''
+		Creates the widgets of the settings section along with their deferred images.
+		'''
+		global shake_level_widget
+		upload_images(list(images.sources))
+		buttons.extend([
+			Button(IntPoint(10, 70), IntPoint( 50, 50), images.regions['globe'], change_language,    False, ['settings']),
+			Button(IntPoint(10, 10), IntPoint(110, 50), images.regions['pulse'], change_shake_level, False, ['settings'])
+		])
+		shake_level_widget = LevelWidget(70, 20, [
+			images.regions['level_off'],
+			images.regions['level_low'],
+			images.regions['level_medium'],
+			images.regions['level_high']
+		])
+		loader.report('settings assets ready')
+
+
 	def toggle_settings():
 		'''
 		Shows/Hides the settings section.
 		'''
 		global settings_shown
 		settings_shown = not settings_shown
+		if shake_level_widget is None:
+			build_settings_widgets()
 
 		for btn in buttons:
 			if 'main_row' in btn.classes:
@@ -424,13 +574,15 @@ try:
 	def restore_ui_hint_controller():
 		'''
 		Controls the HowToBringTheUIBackAfterHidingIt hint label.
+
+		*A task; cancelled as soon as the UI is shown again.*
 		'''
 		global restore_ui_hint_shown
 		restore_ui_hint_shown = True
-		end_time = time() + 10
-		while time() < end_time and not ui_shown:
-			sleep(0.02)
-		restore_ui_hint_shown = False
+		try:
+			yield 10
+		finally:
+			restore_ui_hint_shown = False
 
 
 	def toggle_ui():
@@ -441,29 +593,50 @@ try:
 		ui_shown = not ui_shown
 		if settings_shown:
 			toggle_settings()
-		if not restore_ui_hint_already_shown:
+		if ui_shown:
+			tasks.cancel('restore_ui_hint')
+		elif not restore_ui_hint_already_shown:
 			restore_ui_hint_already_shown = True
-			thr = Thread(
-				target = restore_ui_hint_controller,
-				args   = (),
-				name   = 'RestoreUIControllerThread'
-			)
-			thr.start()
+			tasks.start('restore_ui_hint', restore_ui_hint_controller())
+
+
+	def toggle_profiler():
+		'''
+		Shows/Hides the frame-time profiler overlay.
+		'''
+		profiler.enabled = not profiler.enabled
+		refresh_profiler_label()
+
+
+	def refresh_profiler_label(*args):
+		if profiler.enabled:
+			profiler_label.text = profiler.summary()
 
 
 	def toggle_shuffle():
 		'''
 		Toggles tracks playback order.
 		'''
-		settings['shuffle'] = not settings['shuffle']
+		settings.shuffle = not settings.shuffle
 
 
 	def change_shake_level():
-		settings['shake_level'] += 1
-		if settings['shake_level'] > 3:
-			settings['shake_level'] = 0
-		shake_level_widget.level = settings['shake_level']
-		Effector.shake_widget(3 * settings['shake_level'], 3 * settings['shake_level'], 0.25)
+		settings.shake_level = (settings.shake_level + 1) % 4
+		shake_level_widget.set_level(settings.shake_level)
+		effects.shake('shake_level_widget', 3 * settings.shake_level, 3 * settings.shake_level, 0.25)
+
+
+	def pop_bubble(index: int):
+		'''
+		Pops the bubble at the given row of the field.
+		'''
+		global frame_pops
+		bubble_sprites.release(bubbles.remove(index))
+		frame_pops += 1
+		wake_frames()
+		amplitude = 2 * settings.shake_level * governor.tier['effects']
+		if amplitude:
+			effects.shake('screen', amplitude, amplitude, 0.1)
 
 
 	def close_app():
@@ -477,7 +650,7 @@ try:
 
 
 	song_name = Label(
-		text      = f'{locales[locales_list[settings["locale"]]]["song"]}: {music[0]["name"]}',
+		text      = f'{locale["song"]}: {music[0]["name"]}',
 		font_name = 'Arial',
 		font_size = 50,
 		weight    = 'bold',
@@ -488,7 +661,7 @@ try:
 		anchor_x  = 'right'
 	)
 	song_hint = Label(
-		text      = locales[locales_list[settings['locale']]]['to_skip'].format('+'.join(['Ctrl', 'N'])),
+		text      = locale['to_skip'].format('+'.join(['Ctrl', 'N'])),
 		font_name = 'Arial',
 		font_size = 17,
 		italic    = True,
@@ -499,7 +672,7 @@ try:
 	)
 
 	locale_label = Label(
-		text      = f'{locales[locales_list[settings["locale"]]]["self_name"]} ({locales[locales_list[settings["locale"]]]["en_name"]})',
+		text      = f'{locale["self_name"]} ({locale["en_name"]})',
 		font_name = 'Arial',
 		font_size = 20,
 		color     = (255, 255, 255, 100),
@@ -510,7 +683,7 @@ try:
 	)
 
 	restore_ui_hint = Label(
-		text      = locales[locales_list[settings['locale']]]['restore_ui_hint'].format('+'.join(['F1'])),
+		text      = locale['restore_ui_hint'].format('+'.join(['F1'])),
 		font_name = 'Arial',
 		font_size = 20,
 		italic    = True,
@@ -521,15 +694,26 @@ try:
 	)
 
 
+	profiler_label = Label(
+		text      = '',
+		font_name = 'Courier New',
+		font_size = 12,
+		color     = (255, 255, 255, 200),
+		x         = window.width - 10,
+		y         = window.height - 60,
+		anchor_x  = 'right',
+		anchor_y  = 'top',
+		multiline = True,
+		width     = 400
+	)
+
+
 	buttons = [
 		Button(IntPoint( 10, 10), IntPoint( 50, 50), github_img,     open_github,        False, ['main_row']),
 		Button(IntPoint( 70, 10), IntPoint( 50, 50), settings_img,   toggle_settings,    False, ['main_row']),
 		Button(IntPoint(130, 10), IntPoint( 50, 50), shuffle_img,    toggle_shuffle,     True,  ['main_row']),
 		Button(IntPoint(190, 10), IntPoint( 50, 50), play_pause_img, toggle_playback,    False, ['main_row']),
 
-		Button(IntPoint( 10, 70), IntPoint( 50, 50), globe_img,      change_language,    False, ['settings']),
-		Button(IntPoint( 10, 10), IntPoint(110, 50), pulse_img,      change_shake_level, False, ['settings']),
-
 		Button(IntPoint(10, window.height - 60), IntPoint(50, 50), hide_img, toggle_ui, False, []),
 
 		Button(IntPoint(window.width - 90, window.height - 40), IntPoint(30, 30), minimize_img, window.minimize, False, ['window_controls']),
@@ -537,14 +721,114 @@ try:
 	]
 
 
-	if not settings['shuffle']:
+	if not settings.shuffle:
 		buttons[2].state = False
 		buttons[2].cross.y = buttons[2].pos.y
 		buttons[2].tick.y = -15
 
 
-	def update(*args) -> None:
-		...
+	def replay_events() -> None:
+		'''
+		Feeds the recorded events that are due before the next step.
+		'''
+		global replay_finished
+		for event in replay.due(simulation.steps):
+			if event.kind == SPAWN:
+				x_origin, amplitude, frequency, x_shift, speed, anchor, common = event.args
+				bubbles.spawn(x_origin, amplitude, frequency, x_shift, speed, common, anchor)
+				continue
+			# Inputs see the bubbles where they were drawn when the input happened
+			bubbles.interpolate(event.alpha)
+			if event.kind == MOUSE_PRESS:
+				on_mouse_motion(event.args[0], event.args[1], 0, 0)
+				emulated_mouse_press(*event.args)
+			elif event.kind == KEY_PRESS:
+				handle_key(*event.args)
+			else:
+				cursor_pos.x, cursor_pos.y = event.args[:2]
+				handle_gamepad_button(event.args[2])
+		# Checked after the feeding, so that a log without events ends as well
+		if replay.finished:
+			replay_finished = True
+			Console.log('replay finished', 'Session', 'I')
+			schedule_once(lambda dt: close_app(), 0)
+
+	replay_finished = False
+
+
+	def simulation_step(dt: float) -> None:
+		'''
+		Advances the scene by one fixed step.
+		'''
+		if replay is not None and not replay_finished:
+			replay_events()
+		for i in bubbles.step(dt):
+			bubbles.payload[i] = bubble_sprites.acquire(bubble_img if bubbles.common[i] else weighted_companion_cube_img)
+		for sprite in bubbles.cull(window.height + bubbles.size):
+			bubble_sprites.release(sprite)
+		if governor.tier['rotate_cubes']:
+			for i in bubbles.uncommon():
+				bubbles.payload[i].rotation += 0.1
+
+	simulation = FixedStep(1/60, simulation_step)
+
+
+	def fit_simulation_steps() -> None:
+		'''
+		Lets one frame at the slowest paced rate run all of its steps.
+		'''
+		simulation.max_steps = max(5, ceil(1 / (pacer.min_fps * simulation.step)))
+
+	fit_simulation_steps()
+
+
+	def update(dt: float) -> None:
+		if replay is not None and args.replay_speed == 'max':
+			dt = simulation.max_steps * simulation.step
+		simulation.advance(dt, perf_counter())
+
+
+	def frame(dt: float) -> None:
+		'''
+		Everything done once per frame, ending with the redraw.
+		'''
+		global tick_ms
+		start = perf_counter()
+		if not gamepad_idle:
+			gamepad_task(dt)
+		# The gamepad or an ended replay may have closed the window, and with it the GL context
+		if window.context is None or event_loop.has_exit:
+			return None
+		simulation_task(dt)
+		effects_task(dt)
+		tick_ms = (perf_counter() - start) * 1000
+		window.draw(dt)
+		pace_frames()
+
+	simulation_task = profiler.wrap('simulation', update)
+	effects_task = profiler.wrap('effects', effects.tick)
+
+
+	def pace_frames() -> None:
+		'''
+		Reschedules `frame()` if the scene needs another frame rate.
+		'''
+		global frame_rate
+		rate = pacer.rate(time(), bubbles.max_speed(), busy = len(effects) > 0)
+		if rate == frame_rate:
+			return None
+		Console.log(f'redrawing at {rate} FPS', 'FramePacer', 'D')
+		frame_rate = rate
+		unschedule(frame)
+		schedule_interval(frame, 1 / rate)
+
+
+	def wake_frames() -> None:
+		'''
+		Switches to the full frame rate for a while, e.g. on input.
+		'''
+		pacer.wake(time())
+		pace_frames()
 
 
 	#######################
@@ -553,104 +837,166 @@ try:
 
 
 	def emulated_mouse_press(x, y, button, modifiers) -> None:
-		global bubbles
-
 		for btn in buttons:
 			if btn.click(x, y):
 				return None
 
-		for i, obj in enumerate(bubbles):
-			if obj.common:
-				if x > obj.x and x < obj.x + obj.size and y > obj.y and y < obj.y + obj.size:
-					obj.pop()
-					bubbles.pop(i)
-					return None
-			else:
-				if x > obj.x - (weighted_companion_cube_img.width // 2) and x < obj.x - (weighted_companion_cube_img.width // 2) + obj.size and y > obj.y - (weighted_companion_cube_img.width // 2) and y < obj.y - (weighted_companion_cube_img.width // 2) + obj.size:
-					obj.pop()
-					bubbles.pop(i)
-					return None
+		index = bubbles.hit(x, y)
+		if index >= 0:
+			pop_bubble(index)
 				
 
-	def gamepad_handler(*args) -> None:
-		global hotkey_provider, a_old, b_old, x_old, rb_old
+	def set_gamepad_idle(idle: bool) -> None:
+		global gamepad_idle
+		if idle == gamepad_idle:
+			return None
+		gamepad_idle = idle
+		# While active, the gamepad is handled by frame()
+		if idle:
+			schedule_interval(gamepad_task, GAMEPAD_IDLE_INTERVAL)
+		else:
+			unschedule(gamepad_task)
+
 
-		if gamepad.registered and hotkey_provider != Hotkeys.Gamepad:
-			hotkey_provider = Hotkeys.Gamepad
+	def gamepad_handler(dt: float) -> None:
+		global hotkey_provider, gamepad_last_input
+
+		# The hints follow the gamepad being plugged in and out
+		if gamepad.registered != (hotkey_provider == Hotkeys.Gamepad):
+			hotkey_provider = Hotkeys.Gamepad if gamepad.registered else Hotkeys.Keyboard
 			change_language(just_refresh = True)
 
-		window.set_mouse_position(
-			int(cursor_pos.x + gamepad.stick.left.x * settings['gamepad']['mouse_sensitivity']),
-			int(cursor_pos.y + 1 - gamepad.stick.left.y * settings['gamepad']['mouse_sensitivity'])
-		)
+		events = gamepad.poll_events()
+		stick = gamepad.state.left
+		if events or stick:
+			gamepad_last_input = time()
+			set_gamepad_idle(False)
+			wake_frames()
+		elif time() - gamepad_last_input > GAMEPAD_IDLE_AFTER:
+			set_gamepad_idle(True)
+
+		# Moving the pointer is a round trip to the window system, so a centered stick leaves it alone.
+		# The handler runs once per frame, so the stick speed is scaled to the old 100 Hz polling.
+		# The first call after the idle polling spans a whole idle interval, which must not make the pointer jump.
+		if stick:
+			step = min(dt, 1/60) * mouse_sensitivity * 100
+			window.set_mouse_position(
+				int(cursor_pos.x + stick.x * step),
+				int(cursor_pos.y + 1 - stick.y * step)
+			)
+
+		for event in events:
+			if not event.pressed or replay is not None:
+				continue
+			if recorder is not None:
+				recorder.gamepad_press(cursor_pos.x, cursor_pos.y, event.button)
+			handle_gamepad_button(event.button)
+
 
-		if (gamepad.key.a or gamepad.trigger.right.value > 0.5) and not a_old: emulated_mouse_press(cursor_pos.x, cursor_pos.y, -1, -1)
-		if gamepad.key.b and not b_old: toggle_playback()
-		if gamepad.key.x and not x_old: toggle_ui()
-		if gamepad.bumper.right and not rb_old: media_player.next_source()
+	def handle_gamepad_button(button: str) -> None:
+		match button:
+			case 'A' | 'RT':
+				emulated_mouse_press(cursor_pos.x, cursor_pos.y, -1, -1)
+			case 'B':
+				toggle_playback()
+			case 'X':
+				toggle_ui()
+			case 'RB':
+				media_player.next_source()
 
-		a_old  = bool(gamepad.key.a) or gamepad.trigger.right.value > 0.5
-		b_old  = bool(gamepad.key.b)
-		x_old  = bool(gamepad.key.x)
-		rb_old = bool(gamepad.bumper.right)
+	gamepad_task = profiler.wrap('gamepad', gamepad_handler)
+	gamepad_idle = False
+	gamepad_last_input = time()
 
 
 	@media_player.event
 	def on_player_next_source():
 		global show_song_info_until
-		song_name.text = f'{locales[locales_list[settings["locale"]]]["song"]}: {music[selected_track]["name"]}'
+		song_name.text = f'{locale["song"]}: {playlist.current["name"]}'
 		show_song_info_until = time() + 5
 
-	shake_level_widget = LevelWidget(70, 20, [
-		level0_img,
-		level1_img,
-		level2_img,
-		level3_img
-	])
+	shake_level_widget: LevelWidget | None = None
 
 
 	@window.event
 	def on_draw():
-		global bubbles
+		global frame_pops, reported_misses
 
-		window.clear()
+		start = perf_counter()
+		with profiler.phase('frame'):
+			draw_frame()
+		frame_ms = (perf_counter() - start) * 1000
 
-		new_bubbles: list[Bubble] = []
-		for bubble in reversed(bubbles):
-			bubble.update_y()
-			if bubble.y < window.height + bubble.size and not bubble.popped:
-				bubble.draw()
-				new_bubbles.insert(0, bubble)
-		bubbles = new_bubbles
+		telemetry.record(time(), frame_ms, len(bubbles), frame_pops, len(effects), playlist.misses - reported_misses)
+		frame_pops = 0
+		reported_misses = playlist.misses
 
-		if restore_ui_hint_shown:
-			restore_ui_hint.draw()
+		if profiler.enabled:
+			profiler_label.draw()
 
-		# Draw the UI if it is not hidden
-		if ui_shown:
-			ui_batch.draw()
+		if settings.quality.governor:
+			# The CPU work of the frame, or the GPU time of the bubbles where the driver can measure it and it is longer
+			gpu_ms = scene.take_gpu_ms() or 0.0
+			tier = governor.record(max(tick_ms + frame_ms, gpu_ms))
+			if tier is not None:
+				Console.log(f'switching to the {tier["name"]!r} quality tier (p95 frame time {governor.p95:.1f} ms)', 'QualityGovernor', 'I')
+				apply_quality_tier()
 
-		# Draw gamepad hints if required
-		# TODO: freaking hints
-		if gamepad.registered:
-			gamepad_ctrls_batch.draw()
 
-		# Draw the settings if they are not hidden
-		if settings_shown:
-			settings_batch.draw()
-			shake_level_widget.draw()
+	def draw_frame():
+		global last_alpha
+
+		with profiler.phase('clear'):
+			scene.begin()
+			window.clear()
+
+		with profiler.phase('interpolate'):
+			last_alpha = simulation.alpha(perf_counter())
+			bubbles.interpolate(last_alpha)
+			n = len(bubbles)
+			for sprite, x, y in zip(bubbles.payload, bubbles.x[:n].tolist(), bubbles.y[:n].tolist()):
+				sprite.position = (x, y, 0)
+
+		with profiler.phase('bubbles'):
+			bubbles_batch.draw()
+			scene.end()
+
+		with profiler.phase('ui'):
+			if restore_ui_hint_shown:
+				restore_ui_hint.draw()
+
+			# Draw the UI if it is not hidden
+			if ui_shown:
+				ui_batch.draw()
+
+			# Draw gamepad hints if required
+			# TODO: freaking hints
+			if gamepad.registered:
+				gamepad_ctrls_batch.draw()
 
-		# Draw song info if it should be displayed at the moment
-		if show_song_info_until >= time():
-			song_name.draw()
-			song_hint.draw()
+		with profiler.phase('settings'):
+			# Draw the settings if they are not hidden
+			if settings_shown:
+				settings_batch.draw()
 
-		# Draw the cursor
-		cursor.draw()
+		with profiler.phase('labels'):
+			# Draw song info if it should be displayed at the moment
+			if show_song_info_until >= time():
+				song_name.draw()
+				song_hint.draw()
+
+		with profiler.phase('cursor'):
+			# Draw the cursor
+			cursor.draw()
 
 
 	@window.event
 	def on_mouse_press(x, y, button, modifiers):
+		wake_frames()
+		if replay is not None:
+			return None
+		if recorder is not None:
+			recorder.mouse_press(x, y, button, modifiers)
 		emulated_mouse_press(x, y, button, modifiers)
 
 
@@ -660,6 +1006,7 @@ try:
 		cursor_pos.y = y
 		cursor.x = x
 		cursor.y = y - 20
+		wake_frames()
 
 
 	@window.event
@@ -669,6 +1016,16 @@ try:
 
 	@window.event
 	def on_key_press(symbol, modifiers):
+		wake_frames()
+		# A replay only takes the profiler toggle from the keyboard
+		if replay is not None and symbol != key.F3:
+			return EVENT_HANDLED
+		if recorder is not None:
+			recorder.key_press(symbol, modifiers)
+		return handle_key(symbol, modifiers)
+
+
+	def handle_key(symbol, modifiers):
 		match symbol:
 
 			case key.ESCAPE:
@@ -680,6 +1037,10 @@ try:
 				toggle_ui()
 				return EVENT_HANDLED
 
+			case key.F3:
+				toggle_profiler()
+				return EVENT_HANDLED
+
 			case key.S:
 				if modifiers & key.MOD_CTRL:
 					buttons[2].click(buttons[2].pos.x + 1, buttons[2].pos.y + 1)
@@ -697,64 +1058,73 @@ try:
 	@window.event
 	def on_close():
 		Console.log('got window closing intent', 'IntentHandler', 'I')
+		unschedule(frame)
+		Console.log('cancelling tasks', 'IntentHandler', 'I')
+		tasks.cancel_all()
+		if recorder is not None:
+			Console.log('closing the session log', 'IntentHandler', 'I')
+			recorder.close()
 		Console.log('saving settings', 'IntentHandler', 'I')
 		save_settings()
+		Console.log('stopping asset loader', 'IntentHandler', 'I')
+		loader.shutdown()
+		Console.log('stopping track prefetch', 'IntentHandler', 'I')
+		playlist.close()
+		Console.log('flushing telemetry', 'IntentHandler', 'I')
+		telemetry.close()
 		Console.log('stopping gamepad listener', 'IntentHandler', 'I')
 		gamepad.stop()
 		Console.log('exitting', 'IntentHandler', 'I')
+		Console.drain(1)
 
 
 	def spawner():
 		'''
-		Creates random bubbles with a random delay.
+		Spawns the bubbles bubble_spawner asks for.
 		
-		*Blocking.*
-		'''
-		if not event_loop.is_running:
-			while not event_loop.is_running:
-				Console.log('waiting until event_loop runs', 'Spawner', 'I')
-				sleep(0.2)
-		Console.log('met event_loop', 'Spawner', 'I')
-
-		while event_loop.is_running:
-			delay = randint(1, 3)
-			sleep(delay)
-			bubbles.insert(0, Bubble(
-				x_origin  = randint(0, window.width - bubble_img.width),
-				speed     = randint(30, 60),
-				frequency = randint(15, 25) / 1000,
-				x_shift   = int(random() * 2 - 1)
-			))
-			
-		Console.log('event_loop is inactive; ending', 'Spawner', 'I')
-
-
-	# Creating threads
-	spawner_thread = Thread(
-		target = spawner,
-		args   = (),
-		name   = 'SpawnerThread'
-	)
+		*A task.*
+		'''
+		dt = 0.0
+		while True:
+			bubble_spawner.advance(dt, len(bubbles), spawn_target)
+			# Spawns only become rows on the next simulation step anyway
+			dt = yield max(bubble_spawner.delay(), 1/60)
+
+
+	@event_loop.event
+	def on_enter():
+		Console.log('event loop started; starting tasks', 'TaskScheduler', 'I')
+		# A replay spawns the recorded bubbles instead
+		if replay is None:
+			tasks.start('spawner', spawner())
+		if not images.cached:
+			tasks.start('deferred_images', upload_deferred_images())
 
 	# Starting everything 
 	gamepad.start()
 
-	schedule_interval(gamepad_handler, 0.01)
-	schedule_interval(update, 1/60)
+	# Frames are paced by pace_frames() instead of a fixed redraw interval
+	pace_frames()
+	schedule_interval(refresh_profiler_label, 0.5)
 
-	spawner_thread.start()
 
+	media_player.queue(playlist.sources())
 	media_player.play()
 	on_player_next_source()
 
-	run()
+	loader.report('first frame ready')
+	run(None)
 
 	# Waiting for event_loop to stop, then cleanup
 	while event_loop.is_running:
 		sleep(1)
 	gamepad.stop()
+	telemetry.close()
+	if recorder is not None:
+		recorder.close()
 	media_player.pause()
 	media_player.delete()
+	Console.drain(1)
 
 except:
 